@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -42,7 +42,7 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 
 # Input files (Experiment)
-inputfiles = ['flowch' + str(i+1) for i in xrange(5)]
+inputfiles = ['flowch' + str(i+1) for i in range(5)]
 
 # Input file (COMSOL
 inputcomsol = 'calculatedvelocityfield.txt'
@@ -74,14 +74,14 @@ for channel in inputfiles:
     # First of all, we use the very first line as reference time and change all time values according to this
     reftime = channeldata['time'][0]
 
-    for i in xrange(len(channeldata['time'])):
+    for i in range(len(channeldata['time'])):
         channeldata['time'][i] = channeldata['time'][i] - reftime
 
     # Create array for velocity vector
     velocities = np.zeros(len(channeldata)-1, dtype=[('vx', 'float64'), ('vy', 'float64')])
 
     # Calculate velocities
-    for i in xrange(len(channeldata['x'])-1):
+    for i in range(len(channeldata['x'])-1):
         # Time difference between current point and next point
         timediff = channeldata['time'][i+1] - channeldata['time'][i]
 
@@ -168,8 +168,8 @@ vx_coarse = scipy.interpolate.griddata((data['x'], data['y']), data['vx'], (x_co
 vy_coarse = scipy.interpolate.griddata((data['x'], data['y']), data['vy'], (x_coarse, y_coarse), method='nearest')
 vl_coarse = np.empty_like(vx_coarse)
 
-for i in xrange(len(vx_coarse)):
-    for j in xrange(len(vx_coarse[i])):
+for i in range(len(vx_coarse)):
+    for j in range(len(vx_coarse[i])):
         # Calculate the velocity value in [mm per s]
         vl_coarse[i, j] = math.hypot(vx_coarse[i, j], vy_coarse[i, j])
 
@@ -178,8 +178,8 @@ vx_fine = scipy.interpolate.griddata((data['x'], data['y']), data['vx'], (x_fine
 vy_fine = scipy.interpolate.griddata((data['x'], data['y']), data['vy'], (x_fine, y_fine), method='nearest')
 vl_fine = np.empty_like(vx_fine)
 
-for i in xrange(len(vx_fine)):
-    for j in xrange(len(vx_fine[i])):
+for i in range(len(vx_fine)):
+    for j in range(len(vx_fine[i])):
         # Calculate the velocity value in [mm per s]
         vl_fine[i, j] = math.hypot(vx_fine[i, j], vy_fine[i, j])
 
@@ -196,7 +196,7 @@ print("average of y-component of velocity field is %.4f (std: %.4f)" % (np.avera
 # Export this data as one array
 exportarray = []
 
-for i in xrange(len(x_coarse.reshape(-1))):
+for i in range(len(x_coarse.reshape(-1))):
     exportarray.append((x_coarse.reshape(-1)[i], y_coarse.reshape(-1)[i], vx_coarse.reshape(-1)[i],
                        vy_coarse.reshape(-1)[i]))
 
@@ -225,8 +225,8 @@ vy_comsol_coarse = scipy.interpolate.griddata((comsoldata['x'], comsoldata['y'])
                                               (x_coarse, y_coarse), method='nearest')
 vl_comsol_coarse = np.empty_like(vx_comsol_coarse)
 
-for i in xrange(len(vx_comsol_coarse)):
-    for j in xrange(len(vx_comsol_coarse[i])):
+for i in range(len(vx_comsol_coarse)):
+    for j in range(len(vx_comsol_coarse[i])):
         # Calculate the velocity value in [mm per s]
         vl_comsol_coarse[i, j] = math.hypot(vx_comsol_coarse[i, j], vy_comsol_coarse[i, j])
 
@@ -237,8 +237,8 @@ vy_comsol_fine = scipy.interpolate.griddata((comsoldata['x'], comsoldata['y']),
                                             (x_fine, y_fine), method='nearest')
 vl_comsol_fine = np.empty_like(vx_comsol_fine)
 
-for i in xrange(len(vx_comsol_fine)):
-    for j in xrange(len(vx_comsol_fine[i])):
+for i in range(len(vx_comsol_fine)):
+    for j in range(len(vx_comsol_fine[i])):
         # Calculate the velocity value in [mm per s]
         vl_comsol_fine[i, j] = math.hypot(vx_comsol_fine[i, j], vy_comsol_fine[i, j])
 
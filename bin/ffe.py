@@ -24,7 +24,8 @@ Logs almost everything to a (non-configured) logger called 'FFE'.
 
 Compatibility
 -------------
-`ffe` has been tested and developed on Python 2.7.
+`ffe` has been developed on Python 2.7 and runs on Python 2.7 and Python 3. Data written into PNG files by one version
+ can be read by the other.
 
 Requirements
 -------------
@@ -74,16 +75,9 @@ Documentation for `ffe` module was automatically generated using [`pdoc`](https:
 # Import modules
 import cv2                          # OpenCV
 import numpy as np                  # Numpy - You always need this.
-from numpy.lib.utils import source
-import ConfigParser                 # Reading/Writing config files
 import logging                      # Logging of some sort
 import png                          # Raw PNG read/write functions
-import cPickle                      # For serializing dictionaries (and other things)
 import math                         # Math! You didn't think we could go without any math, right?
-import matplotlib.pyplot as plt     # For plotting intermediate graphs (debug)
-import scipy                        # Scientific things!
-import scipy.signal                 # Unfortunately, every submodule has to be imported explicitely for scipy :(
-import scipy.interpolate
 import operator                     # Operator tools
 import itertools                    # Iteration tools
 import copy                         # Make 1:1 copies of whole objects (numpy/opencv do not copy objects)
@@ -91,6 +85,30 @@ import heapq                        # Fast implementation of a priority queue
 import time                         # Time functions
 import warnings                     # Scipy module and some others use this for generating warnings
 import os                           # Some operating system functions
+import sys                          # Sys functions
+
+# Scipy (scientific things!) and matplotlib (for plotting intermediate graphs in debug mode) are imported by the
+# functions using them: loading them takes far longer than finding the features of an image, which does not need them
+
+# Reading/Writing config files and serializing dictionaries (and other things); the modules were renamed in Python 3
+try:
+    import ConfigParser as configparser
+    import cPickle as pickle
+except ImportError:
+    import configparser
+    import pickle
+
+# Python 3 has no xrange (its range is already lazy)
+try:
+    xrange
+except NameError:
+    xrange = range
+
+# Timer for measuring durations; time.clock was removed in Python 3.8
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.clock
 
 
 # Create but do not configure logger
@@ -106,6 +124,11 @@ debugmode = False
  output (<i>e.g.</i> plot windows). This limits the automation of evaluation and should only be used for debugging
  purposes."""
 
+# Offsets of the eight neighbours of a pixel given as (dx, dy)
+neighbouroffsets = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+"""Offsets `(dx, dy)` of the eight direct neighbours of a pixel. Used by `ffe.findPathOnImage` to find the
+ neighbours of a node without searching the whole queue."""
+
 
 # Function: Enable debug mode
 def enableDebugMode():
@@ -146,7 +169,7 @@ def applyCameraSettings(camera):
     (`cv2.VideoCapture()`). Returns a dictionary with the recording settings.
     """
     # Read camera settings
-    Config = ConfigParser.ConfigParser()
+    Config = configparser.ConfigParser()
     Config.read("camera.ini")
 
     # Apply general camera settings
@@ -236,7 +259,7 @@ def getOutputSettings():
     and by `Random experiment` if necessary.
     """
     # Read from config file
-    Config = ConfigParser.ConfigParser()
+    Config = configparser.ConfigParser()
     Config.read("output.ini")
 
     # Put into dictionary
@@ -323,13 +346,31 @@ def addDataChunksToPng(filename, chunks):
     chunklist.extend(chunks)
 
     # Add IEND
-    chunklist.append(["IEND", ""])
+    chunklist.append([b"IEND", b""])
 
     # Now write back the chunks
     with open(filename, "wb") as file:
         png.write_chunks(file, chunklist)
 
 
+# Function: Converts numpy values in (nested) dictionaries, lists, and tuples to Python numbers
+def convertToPythonTypes(data):
+    """Converts all numpy values (<i>e.g.</i> `numpy.int32`) in `data` to the respective Python numbers. `data` can be
+    a single value or (nested) dictionaries, lists, and tuples. Returns the converted data.
+    """
+    # Dictionary, list, or tuple? Then convert every item
+    if isinstance(data, dict):
+        return dict((key, convertToPythonTypes(value)) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return type(data)(convertToPythonTypes(item) for item in data)
+
+    # Numpy value?
+    if isinstance(data, np.generic):
+        return data.item()
+
+    return data
+
+
 # Function: Creates tEXt and dfFe chunks from a dictionary
 def createChunksFromDictionary(data):
     """Creates `tEXt` and `dfFe` chunks from a dictionary. `data` is the dictionary of data to be transformed
@@ -344,47 +385,145 @@ def createChunksFromDictionary(data):
     # Chunks
     chunks = []
 
-    # For dfFe we just serialize the dictionary
-    chunks.append(["dfFe", cPickle.dumps(data)])
+    # Numpy values are stored as Python numbers; pickled numpy values can only be read by similar numpy versions
+    data = convertToPythonTypes(data)
+
+    # For dfFe we just serialize the dictionary; protocol 0 can be read by Python 2 and Python 3
+    chunks.append([b"dfFe", pickle.dumps(data, 0)])
 
     # We also want to put them a tEXt into the file, so that PNG reader can list them
     for key in data:
         # Truncate key to 79 characters (if needed)
         keytext = key[:79]
+        # Text chunks are Latin-1 encoded
+        text = "%s\x00%s" % (keytext, data[key])
+        if not isinstance(text, bytes):
+            text = text.encode("latin-1")
         # Append chunk
-        chunks.append(["tEXt", "%s\x00%s" % (keytext, data[key])])
+        chunks.append([b"tEXt", text])
 
     # Return chunks
     return chunks
 
 
+# Function: Deserializes the data of a dfFe chunk
+def loadDataOfChunk(chunkdata):
+    """Deserializes the content `chunkdata` of a `dfFe` chunk and returns it (usually a dictionary). Chunks written
+    by Python 2 are decoded as Latin-1 when read by Python 3, so that strings and numpy values survive the transfer.
+    """
+    # Python 2 knows no encoding
+    if sys.version_info[0] < 3:
+        return pickle.loads(chunkdata)
+
+    return pickle.loads(chunkdata, encoding="latin1")
+
+
 # Function: Loads the dictionary from the dfFe chunk
 def loadDictionaryFromPng(filename):
     """Loads the dictionary from a `dfFe` chunk of a PNG file given by `filename`. Returns the data from the `dfFe`
     chunk as dictionary or `None` if an error occurs.
+
+    Only the raw chunks are read; the image data itself is not decompressed, so this is cheap compared to decoding the
+    image (e.g. with `cv2.imread`).
     """
     # Is filename a string?
     if type(filename) is not str:
         logger.error(u"loadDictionaryFromPng(filename): filename is not a string")
         return None
 
-    # Open the file
-    file = png.Reader(filename)
+    # Create empty dictionray
+    data = {}
 
-    # Get list of chunks in file
-    chunklist = list(file.chunks())
+    # Find the dfFe chunk(s); go through the chunks one by one instead of keeping all of them (including the image
+    # data) in memory
+    try:
+        for c in png.Reader(filename).chunks():
+            if c[0] == b"dfFe":
+                # Append to dictionary (overwrites data with the same keys)
+                data.update(loadDataOfChunk(c[1]))
+
+    # File could not be read or is not a PNG file
+    except (IOError, png.Error):
+        return None
+
+    # Return dictionary
+    return data
+
+
+# Function: Loads the image and the dictionary of a PNG
+def loadImageAndDictionaryFromPng(filename, flags=cv2.IMREAD_COLOR):
+    """Loads the image and the dictionary from the `dfFe` chunk of a PNG file given by `filename`. The file is read
+    only once; the image is decoded by `cv2.imdecode` with `flags` (same as for `cv2.imread`) and the dictionary is
+    taken from the chunks of the same data (see `ffe.loadDictionaryFromPng`).
+
+    Returns a tuple `(image, data)`. `image` is `None` if the file could not be read or decoded (then `data` is an
+    empty dictionary).
+    """
+    # Is filename a string?
+    if type(filename) is not str:
+        logger.error(u"loadImageAndDictionaryFromPng(filename, flags): filename is not a string")
+        return None, {}
+
+    # Read the whole file
+    try:
+        with open(filename, "rb") as file:
+            buffer = file.read()
+    except IOError:
+        return None, {}
+
+    # Decode the image
+    image = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), flags)
+
+    # Error?
+    if image is None:
+        return None, {}
 
     # Create empty dictionray
     data = {}
 
-    # Find the dfFe chunk(s)
-    for c in chunklist:
-        if str(c[0]) == "dfFe":
+    # Find the dfFe chunk(s) in the data of the file
+    for c in png.Reader(bytes=buffer).chunks():
+        if c[0] == b"dfFe":
             # Append to dictionary (overwrites data with the same keys)
-            data.update(cPickle.loads(str(c[1])))
+            data.update(loadDataOfChunk(c[1]))
+
+    # Return image and dictionary
+    return image, data
 
-    # Return dictionary
-    return data
+
+# Function: Replaces the dfFe and tEXt chunks of a PNG
+def writeDataChunksToPng(filename, chunklist, datachunks):
+    """Replaces all `dfFe` and `tEXt` chunks of the PNG file `filename` by `datachunks`, which are written right
+    before the `IEND`-chunk. `chunklist` is the list of chunk types and data lengths `(type, length)` of this file in
+    the order read by `png.Reader` (without `IEND`).
+
+    If the old `dfFe` and `tEXt` chunks are the last chunks of the file (which is the case when they were written by
+    this function), only the end of the file starting at the first of them is written again; the image data stays
+    untouched on disk. Otherwise, the whole file is read and written again.
+    """
+    # Index of the first of the dfFe and tEXt chunks at the end of the file
+    first = len(chunklist)
+    while first > 0 and chunklist[first - 1][0] in (b"dfFe", b"tEXt"):
+        first -= 1
+
+    # Other dfFe or tEXt chunks in the file? Write the whole file without them
+    if any(c[0] in (b"dfFe", b"tEXt") for c in chunklist[:first]):
+        chunklist = [c for c in png.Reader(filename).chunks() if c[0] not in (b"dfFe", b"tEXt", b"IEND")]
+        with open(filename, "wb") as file:
+            png.write_chunks(file, chunklist + datachunks + [[b"IEND", b""]])
+        return
+
+    # Position of the first data chunk in the file: 8 bytes signature and for each chunk 12 bytes (length, type, and
+    # CRC) plus its data
+    position = 8 + sum(12 + c[1] for c in chunklist[:first])
+
+    # Write new chunks and IEND from there
+    with open(filename, "r+b") as file:
+        file.seek(position)
+        file.truncate()
+        for chunk in datachunks:
+            png.write_chunk(file, chunk[0], chunk[1])
+        png.write_chunk(file, b"IEND", b"")
 
 
 # Function: Updates the dictionary in the dfFe chunk of a PNG
@@ -405,20 +544,22 @@ def updateDictionaryOfPng(filename, updatedata):
     # Open the file
     pngfile = png.Reader(filename)
 
-    # Get list of chunks in file
-    chunklist = list(pngfile.chunks())
-
-    # Remove last item (IEND)
-    del chunklist[-1]
-
     # Create empty dictionray
     data = {}
 
-    # Find the dfFe and tEXt chunk(s)
-    for c in chunklist:
-        if str(c[0]) == "dfFe":
+    # Types and lengths of the chunks in file; go through the chunks one by one instead of keeping all of them
+    # (including the image data) in memory
+    chunklist = []
+    for c in pngfile.chunks():
+        # Find the dfFe chunk(s)
+        if c[0] == b"dfFe":
             # Append to dictionary (overwrites data with the same keys)
-            data.update(cPickle.loads(str(c[1])))
+            data.update(loadDataOfChunk(c[1]))
+
+        chunklist.append((c[0], len(c[1])))
+
+    # Remove last item (IEND)
+    del chunklist[-1]
 
     # Now update the dictionary
     data.update(updatedata)
@@ -426,18 +567,8 @@ def updateDictionaryOfPng(filename, updatedata):
     # Create new dfFe and tEXt chunks
     datachunks = createChunksFromDictionary(data)
 
-    # Create a new chunklist without the old dfFe
-    chunklist = [c for c in chunklist if not str(c[0]) == "dfFe" and not str(c[0]) == "tEXt"]
-
-    # Add chunks from above
-    chunklist.extend(datachunks)
-
-    # Add IEND
-    chunklist.append(["IEND", ""])
-
-    # Now write back the chunks
-    with open(filename, "wb") as file:
-        png.write_chunks(file, chunklist)
+    # Replace the old dfFe and tEXt chunks with them
+    writeDataChunksToPng(filename, chunklist, datachunks)
 
 
 # Function: Replaces the dictionary in the dfFe chunk of a PNG
@@ -458,8 +589,8 @@ def replaceDictionaryOfPng(filename, replacedata):
     # Open the file
     pngfile = png.Reader(filename)
 
-    # Get list of chunks in file
-    chunklist = list(pngfile.chunks())
+    # Types and lengths of the chunks in file (the chunk data itself is not kept)
+    chunklist = [(c[0], len(c[1])) for c in pngfile.chunks()]
 
     # Remove last item (IEND)
     del chunklist[-1]
@@ -467,29 +598,22 @@ def replaceDictionaryOfPng(filename, replacedata):
     # Create new dfFe and tEXt chunks
     datachunks = createChunksFromDictionary(replacedata)
 
-    # Create a new chunklist without the old dfFe
-    chunklist = [c for c in chunklist if not str(c[0]) == "dfFe" and not str(c[0]) == "tEXt"]
-
-    # Add chunks from above
-    chunklist.extend(datachunks)
-
-    # Add IEND
-    chunklist.append(["IEND", ""])
-
-    # Now write back the chunks
-    with open(filename, "wb") as file:
-        png.write_chunks(file, chunklist)
+    # Replace the old dfFe and tEXt chunks with them
+    writeDataChunksToPng(filename, chunklist, datachunks)
 
 
 # Function: Prepares an overlay image based on the some filedata
-def prepareOverlayImage((width, height), color, data):
+def prepareOverlayImage(size, color, data):
     """Prepares the overlay image for user presentation. Is used to render the live view and the frames in the video
-    files. `width` and `height` is the requested size of the overlay image. `color` is the color given in BGR used
+    files. `size = (width, height)` is the requested size of the overlay image. `color` is the color given in BGR used
     for text rendering. `data` is a dictionary of information, which will be printed on the overlay image (`Timestamp`,
     `Snapshot time`, `Dataline 1`, and `Dataline 2`).
 
     Returns an overlay image in form of a numpy array.
     """
+    # Size of the image
+    width, height = size
+
     # Is data a dictionary?
     if type(data) is not dict:
         logger.error(u"prepareOverlayImage(..., data): data is not a dictionary")
@@ -612,6 +736,51 @@ def findSeparationZoneBoundaries(contours, hierarchy, threshold, threshratio, va
     return -1, -1
 
 
+# Function: Removes contours with too few points (noise) and updates the hierarchy accordingly
+def filterContours(contours, hierarchy, minpoints):
+    """Removes all contours with less than `minpoints` points, which have no children, from `contours` and
+    `hierarchy` (the respective return values from `cv2.findContours`). With `minpoints = 3`, these are the single
+    pixels and one pixel thin lines, which enclose no area and hence can neither be a boundary of the separation zone
+    nor a flow marker.
+
+    The indices in the hierarchy (next, prev, child, parent) are remapped to the remaining contours. Returns the
+    filtered contours (list) and hierarchy (numpy array) or the unchanged `contours` and `hierarchy` if an error
+    occurred.
+    """
+    # Contours and hierarchy should match
+    if hierarchy is None or len(contours) != len(hierarchy[0]):
+        logger.error(u"filterContours(contours, hierarchy, minpoints): contours and hierarchy do not match.")
+        return contours, hierarchy
+
+    # Structure of hierarchy: [(next, prev, child, parent)]
+    links = hierarchy[0]
+
+    # Keep contours with enough points or with children (a parent is always kept then)
+    keep = [i for i in xrange(len(contours)) if len(contours[i]) >= minpoints or links[i][2] != -1]
+
+    # Nothing to remove?
+    if len(keep) == len(contours):
+        return contours, hierarchy
+
+    # New index for each old one; the extra last entry maps -1 to -1
+    newindex = np.full(len(contours) + 1, -1, dtype=np.intp)
+    newindex[keep] = np.arange(len(keep))
+
+    # Follows a chain of siblings (next or prev) until a remaining contour is found
+    def findRemaining(index, direction):
+        while index != -1 and newindex[index] == -1:
+            index = links[index][direction]
+        return newindex[index]
+
+    # Build new hierarchy; removed contours have no children, so the parent of a remaining contour remains as well
+    newlinks = np.empty((len(keep), 4), dtype=hierarchy.dtype)
+    for n, i in enumerate(keep):
+        newlinks[n] = (findRemaining(links[i][0], 0), findRemaining(links[i][1], 1),
+                       findRemaining(links[i][2], 0), newindex[links[i][3]])
+
+    return [contours[i] for i in keep], newlinks[np.newaxis]
+
+
 # Function: Debug output as debugNNN.png. Returns counter + 1. So, it can be used as
 #           debugcounter = ffe.debugWriteImage(image, debugcounter)
 def debugWriteImage(image, counter):
@@ -644,10 +813,13 @@ def debugWriteImage(image, counter):
 
 
 # Function: Sorts coordinates by distance to a given point
-def sortCoordinatesByDistanceToPoint(coordinates, (x, y)):
-    """ Sorts a given list of `coordinates` by distance to the point `(x,y)`. 'coordinates' should be a numpy array.
+def sortCoordinatesByDistanceToPoint(coordinates, point):
+    """ Sorts a given list of `coordinates` by distance to the `point = (x,y)`. 'coordinates' should be a numpy array.
     Returns a sorted list (numpy array) or an empty list if an error occurred.
     """
+    # Coordinates of the point
+    x, y = point
+
     # No numpy array?
     if type(coordinates) is not np.ndarray:
         logger.error(u"sortCoordinatesByDistanceToPoint(coordinates, (x, y)): coordinates should be a "
@@ -665,11 +837,14 @@ def sortCoordinatesByDistanceToPoint(coordinates, (x, y)):
 
 
 # Function: Sort the coordinates, so that the order will be top-left, top-right, bottom-left, bottom-right
-def sortCoordinates(box, (width, height)):
+def sortCoordinates(box, size):
     """ Sorts the coordinates of a given rectangle (`box` given as numpy array), so that the order will be top-left,
-    top-right, bottom-left, bottom-right. `width` and `height` of image or surrounding rectangle. Returns the sorted
+    top-right, bottom-left, bottom-right. `size = (width, height)` of image or surrounding rectangle. Returns the sorted
     coordinates or an empty list if an error occurred.
     """
+    # Size of the image or rectangle
+    width, height = size
+
     # No integer?
     if type(width) is not int or type(height) is not int:
         logger.error(u"sortCoordinates(box, (width, height)): width and height should be integers")
@@ -699,27 +874,63 @@ def sortCoordinates(box, (width, height)):
     return sortedbox
 
 
+# Function: Calculates the center-points (centroids) of contours
+def getCentersOfContours(contours):
+    """ Calculates the center-points (centroids) of all `contours` (as returned by `cv2.findContours`) by using the
+    shoelace formula. This gives the same result as `m10/m00` and `m01/m00` of `cv2.moments`, but does not compute all
+    the moments up to the third order. All contours are processed at once in one flat array of points.
+
+    Returns a list with the rounded center-point of each contour as tuple `(int, int)`; `(0, 0)` if the area of the
+    contour is zero.
+    """
+    # No contours? No centers
+    if len(contours) == 0:
+        return []
+
+    # Put all points into one array; offsets are the indices of the first point of each contour
+    points = np.concatenate([contour.reshape(-1, 2) for contour in contours]).astype(np.float64)
+    lengths = np.array([len(contour) for contour in contours])
+    offsets = np.cumsum(lengths) - lengths
+
+    # Index of the successor of each point; the last point of each contour is followed by its first one (closed)
+    successors = np.arange(1, len(points) + 1)
+    successors[offsets + lengths - 1] = offsets
+
+    # Get x and y of all points and of their successors
+    x, y = points[:, 0], points[:, 1]
+    xnext, ynext = x[successors], y[successors]
+
+    # Cross products of consecutive points; their sum is twice the (signed) area. All values are integers, so that the
+    # sums per contour are exact regardless of the order of summation
+    cross = x * ynext - xnext * y
+    area = 0.5 * np.add.reduceat(cross, offsets)
+    sumx = np.add.reduceat((x + xnext) * cross, offsets)
+    sumy = np.add.reduceat((y + ynext) * cross, offsets)
+
+    # Centroids; rounded half up (like round() of Python 2; the coordinates are never negative). No area? Then there is
+    # no center
+    noarea = area == 0
+    area[noarea] = 1.0
+    centerx = np.where(noarea, 0, np.floor(sumx / (6.0 * area) + 0.5)).astype(int)
+    centery = np.where(noarea, 0, np.floor(sumy / (6.0 * area) + 0.5)).astype(int)
+
+    return list(zip(centerx.tolist(), centery.tolist()))
+
+
 # Function: Tries to find the flow markers on a given image; gives a tuple with indices of the contours
-def findFlowMarkers(contours, (outerzoneindex, innerzoneindex), zonebox, areavariance):
+def findFlowMarkers(contours, zoneindices, zonebox, areavariance):
     """ Tries to find the flow markers on a given image. `contours` is the respective return value of
-    `cv2.findContours`. `outerzoneindex` and `innerzoneindex` are the indices of the outer and inner rectangle of the
-    separation zone (found by `ffe.findSeparationZoneBoundaries`). `zonebox` is the rectangle box of the outer
-    separation zone. `areavariance` is the variance the areas of both flowmarkers are allowed to have.
+    `cv2.findContours`. `zoneindices = (outerzoneindex, innerzoneindex)` are the indices of the outer and inner
+    rectangle of the separation zone (found by `ffe.findSeparationZoneBoundaries`). `zonebox` is the rectangle box of
+    the outer separation zone. `areavariance` is the variance the areas of both flowmarkers are allowed to have.
 
     Returns the indices of both flowmarkers `(int, int)` in `contours` or `-1, -1` if an error occurred.
     """
-    # Calculate the moments / center-points of the contours
-    moments = [0] * len(contours)
-    centers = [0, 0] * len(contours)
+    # Indices of the separation zone boundaries
+    outerzoneindex, innerzoneindex = zoneindices
 
-    # Fill arrays
-    for i in xrange(len(contours)):
-        moments[i] = cv2.moments(contours[i])
-        if moments[i]['m00'] == 0:
-            centers[i] = (0, 0)
-        else:
-            centers[i] = (int(round(moments[i]['m10'] / moments[i]['m00'], 0)),
-                          int(round(moments[i]['m01'] / moments[i]['m00'], 0)))
+    # Calculate the center-points of the contours
+    centers = getCentersOfContours(contours)
 
     # Test each contour
     for i in xrange(len(contours)):
@@ -732,7 +943,7 @@ def findFlowMarkers(contours, (outerzoneindex, innerzoneindex), zonebox, areavar
             continue
 
         # Calculate mirrored point, i.e. (mx, my) = 2*(zx, zy) - (x, y)
-        mirrorpt = tuple(np.subtract(np.multiply(2, centers[innerzoneindex]), centers[i]))
+        mirrorpt = (2 * centers[innerzoneindex][0] - centers[i][0], 2 * centers[innerzoneindex][1] - centers[i][1])
 
         # Mirrored point inside parentbox?
         if cv2.pointPolygonTest(np.array([zonebox]), mirrorpt, False) == +1:
@@ -786,6 +997,32 @@ def extractZoneFromImage(image, zone, border):
     if type(border) is not int or border < 0:
         logger.error(u"extractZoneFromImage(image, zone, border): border is not a positive integer or 0")
 
+    # Transformation matrix and size of the extracted zone
+    transmatrix, width, height = getZoneTransformation(zone)
+
+    # Perform transformation
+    zoneimage = cv2.warpPerspective(image, transmatrix, (width, height))
+
+    # Blacken the border a little bit
+    cv2.rectangle(zoneimage, (0, 0), (width, height), (0, 0, 0), border)
+
+    return zoneimage, transmatrix
+
+
+# Function: Calculates the transformation and the size of an extracted zone
+def getZoneTransformation(zone):
+    """Calculates the transformation matrix and the size of a `zone` such as the separation zone extracted by
+    `ffe.extractZoneFromImage`. `zone` is a list with four coordinates as tuples for the boundary in the order of
+    top-left, top-right, bottom-left, bottom-right. No image is needed, so this is much cheaper than extracting the
+    zone if only its size or transformation is of interest.
+
+    Returns a tuple `(transmatrix, width, height)` or simply `None` if an error occurred.
+    """
+    # Is zone a list of 4 coordinates?
+    if type(zone) is not list or len(zone) != 4:
+        logger.error(u"getZoneTransformation(zone): zone is not a list of 4 tuples")
+        return None
+
     # Width is the distance between the top-left (index: 0) and top-right (index: 1)
     # OR the distance between bottom-left (index: 2) and bottom-right (index: 3)
     # The maximum will be selected.
@@ -805,13 +1042,7 @@ def extractZoneFromImage(image, zone, border):
     # Create matrix for transformation
     transmatrix = cv2.getPerspectiveTransform(sourcepoints, targetpoints)
 
-    # Perform transformation
-    zoneimage = cv2.warpPerspective(image, transmatrix, (width, height))
-
-    # Blacken the border a little bit
-    cv2.rectangle(zoneimage, (0, 0), (width, height), (0, 0, 0), border)
-
-    return zoneimage, transmatrix
+    return transmatrix, width, height
 
 
 # Function: Calculates the inverse flow direction based on flow markers
@@ -875,9 +1106,9 @@ def findMiddleOfConsecutiveNumbers(numbers):
     results = []
 
     # With the help of itertools, find the ranges; This is a receipe from the itertools-docs:
-    for k, g in itertools.groupby(enumerate(numbers), lambda (i, x): i - x):
+    for k, g in itertools.groupby(enumerate(numbers), lambda item: item[0] - item[1]):
         # Get group
-        group = map(operator.itemgetter(1), g)
+        group = list(map(operator.itemgetter(1), g))
         # Middle index
         mindex = int(len(group) / 2)
         # Add the "middle" point of the group and the total width of the group to the results
@@ -926,6 +1157,7 @@ def findEndpointsOfTrajectories(image, threshpenetration=0.70, ordermin=0.05):
         lines[c[0]] = (width - c[1]) if c[1] >= (width - int(threshpenetration * width)) else width
 
     # Try to find local minimas; critical parameter: order (how many points to compare)
+    import scipy.signal
     indices_raw = scipy.signal.argrelextrema(lines, np.less_equal, order=max(int(ordermin*height), 1))[0]
 
     # Remove all indices, for which the corresponding point is out of limit (threshpenetration)
@@ -940,7 +1172,7 @@ def findEndpointsOfTrajectories(image, threshpenetration=0.70, ordermin=0.05):
     # Now compile this into endpoints; recalculates the values (be aware: x and y are exchanged here!)
     for g in groups:
         # Also, we use half of the width as 1st-order-approximation for the FWHM
-        endpoints.append((int(width-lines[g[0]]-1), g[0], max(int(g[1]/2), 1)))
+        endpoints.append((int(width-lines[g[0], 0]-1), g[0], max(int(g[1]/2), 1)))
 
     # Debug?
     if debugmode:
@@ -953,6 +1185,7 @@ def findEndpointsOfTrajectories(image, threshpenetration=0.70, ordermin=0.05):
             cv2.line(debugimage, (width-1, l), (width - lines[l] - 1, l), (255, 215, 0))
 
         # Plot (be aware that this pauses the program)
+        import matplotlib.pyplot as plt
         plt.figure(num=None, figsize=(2 * 4, 1 * 4), dpi=80, facecolor='w', edgecolor='k')
         plt.subplot(1, 2, 1)
         plt.xlabel('x [Pixel]')
@@ -973,6 +1206,79 @@ def findEndpointsOfTrajectories(image, threshpenetration=0.70, ordermin=0.05):
     return endpoints
 
 
+# Function: Calculates the density of the points of an image slice for the gradient method
+def getDensityOfImageSlice(imageslice, size, densityrad):
+    """Calculates the density field of the top-left `size` x `size` points of an 8bit `imageslice` (numpy array) for
+    `ffe.getTrajectoriesFromImage`. The density of a non-zero point (x, y) is the sum of the pixels from
+    `(x-densityrad, y-densityrad)` to `(x+densityrad-1, y+densityrad-1)` divided by `(2*densityrad+1)²` (rounded
+    down). Zero points and points, whose field reaches over the top or left edge of the slice, have a density of zero;
+    fields reaching over the bottom or right edge are cut off.
+
+    Returns the density field as numpy array (int32) of `size` x `size`.
+    """
+    # Shape of slice
+    height, width = imageslice.shape
+
+    # Integral image: sums[y, x] is the sum of all pixels above and left of (x, y)
+    sums = cv2.integral(imageslice)
+
+    # First (including) and last (excluding) row and column of the field of every point
+    indices = np.arange(size)
+    first = np.maximum(indices - densityrad, 0)
+    lastrow = np.minimum(indices + densityrad, height)
+    lastcol = np.minimum(indices + densityrad, width)
+
+    # Sum of every field
+    fieldsums = sums[lastrow][:, lastcol] - sums[first][:, lastcol] - sums[lastrow][:, first] + sums[first][:, first]
+
+    # Only non-zero points inside of the slice, whose field is not over the top or left edge
+    valid = np.zeros((size, size), dtype=bool)
+    valid[:min(size, height), :min(size, width)] = imageslice[:size, :size] != 0
+    valid[:densityrad, :] = False
+    valid[:, :densityrad] = False
+
+    return np.where(valid, fieldsums // (2*densityrad + 1)**2, 0).astype(np.int32)
+
+
+# Function: Calculates the density image of an 8bit image for the Dijkstra path finding and the width search
+def getDensityImage(image, densityrad):
+    """Calculates the density image of an 8bit `image` (numpy array) for `ffe.findPathOnImage` and
+    `ffe.findWidthOfTrajectory`. The density of a non-zero point (x, y) is the sum of the pixels from
+    `(x-densityrad, y-densityrad)` to `(x+densityrad-1, y+densityrad-1)`. Zero points and points, whose field reaches
+    over an edge of the image, have a density of zero.
+
+    Since the density image only depends on `image` and `densityrad`, it can be calculated once and be used for
+    all searches on the same image.
+
+    Returns the density image as numpy array of the same size as `image` (16bit if sufficient, otherwise 32bit).
+    """
+    # Get image shape
+    height, width = image.shape
+
+    # A density is the sum of (2*densityrad)² 8bit values, so use 16bit if this is sufficient (halves the memory of
+    # the image compared to 32bit)
+    densitytype = np.uint16 if (2*densityrad)**2 * 255 <= np.iinfo(np.uint16).max else np.int32
+    densityimage = np.zeros((height, width), dtype=densitytype)
+
+    # Field does not fit into the image at all?
+    if height <= 2*densityrad or width <= 2*densityrad:
+        return densityimage
+
+    # Integral image: sums[y, x] is the sum of all pixels above and left of (x, y)
+    sums = cv2.integral(image)
+
+    # Sum of the field of every point, whose field lies completely inside of the image
+    size = 2*densityrad
+    fieldsums = sums[size:height, size:width] - sums[:height-size, size:width] - sums[size:height, :width-size] + \
+        sums[:height-size, :width-size]
+
+    # The point in the middle should be not zero (we do not want to create points!)
+    inner = image[densityrad:height-densityrad, densityrad:width-densityrad]
+    densityimage[densityrad:height-densityrad, densityrad:width-densityrad] = np.where(inner != 0, fieldsums, 0)
+
+    return densityimage
+
+
 # Function: Find trajectories on 8bit image, given the start and endpoints, by backtracking
 def getTrajectoriesFromImage(image, startpoints, endpoints, flow, maxiteration=1000, gradientfactor=0.10,
                              densityrad=1, maxattraction=1.0):
@@ -1035,11 +1341,14 @@ def getTrajectoriesFromImage(image, startpoints, endpoints, flow, maxiteration=1
     # Image shape
     height, width = image.shape
 
+    # Inlets as array (x, y, diameter) for testing all of them at once
+    inlets = np.array(startpoints, dtype=np.float64).reshape(-1, 3)
+
     # Create empty array of trajectories
     trajectories = []
 
     # Start clock
-    starttime = time.clock()
+    starttime = timer()
 
     # For each endpoint, we start a new search
     for endpoint in endpoints:
@@ -1097,16 +1406,8 @@ def getTrajectoriesFromImage(image, startpoints, endpoints, flow, maxiteration=1
                 imageslice = copy.copy(image[topleftpoint[1]:(topleftpoint[1] + gradient),
                                        topleftpoint[0]:(topleftpoint[0] + gradient)])
 
-            # Create an empty image for density calculations
-            densityimage = np.zeros((gradient - 2 * densityrad, gradient - 2 * densityrad), dtype=np.int32)
-
-            # Calculate the density
-            for x in xrange(gradient-2*densityrad):
-                for y in xrange(gradient-2*densityrad):
-                    # The point in the middle should be not zero (we do not want to create points!)
-                    if not imageslice[y, x] == 0:
-                        densityimage[y, x] = imageslice[y-densityrad:y+densityrad, x-densityrad:x+densityrad].sum()
-                        densityimage[y, x] /= (2*densityrad + 1)**2
+            # Calculate the density (only of non-zero points; we do not want to create points!)
+            densityimage = getDensityOfImageSlice(imageslice, gradient - 2 * densityrad, densityrad)
 
             # Find the maximum(s) of density
             maxvalues = np.transpose(np.where(densityimage == densityimage.max()))
@@ -1149,13 +1450,13 @@ def getTrajectoriesFromImage(image, startpoints, endpoints, flow, maxiteration=1
             trajectory.append((targetpoint[0], targetpoint[1], 10))
 
             # Test if targetpoint is in one of the startpoints (x, y, diameter), if yes, break
-            for pt in startpoints:
-                dist = math.hypot(targetpoint[0]-pt[0], targetpoint[1]-pt[1])
-                if dist <= ((pt[2]/2.0)+gradient):
-                    # Add startpoint
-                    trajectory.append(pt)
-                    # Turn off
-                    run = False
+            reached = np.hypot(targetpoint[0] - inlets[:, 0], targetpoint[1] - inlets[:, 1]) <= \
+                inlets[:, 2]/2.0 + gradient
+            if reached.any():
+                # Add startpoint(s)
+                trajectory.extend(startpoints[index] for index in np.flatnonzero(reached))
+                # Turn off
+                run = False
 
             # Iteration
             i += 1
@@ -1167,10 +1468,10 @@ def getTrajectoriesFromImage(image, startpoints, endpoints, flow, maxiteration=1
             # Append inverse of list (i.e. the trajectory starts left (inlet) and goes to the right (outlet/border))
             trajectories.append(trajectory[::-1])
 
-    endtime = time.clock()
+    endtime = timer()
 
     if debugmode:
-        logger.info(u"Time needed: %.3f seconds" % (endtime - starttime))
+        logger.info(u"Time needed: %.3f seconds", endtime - starttime)
 
     # Return trajectories
     return trajectories
@@ -1215,7 +1516,7 @@ def getSkinOfTrajectory(trajectory):
     is straightforward. The list is empty if an error occurred.
     """
     # Is tracjectory a list?
-    if type(trajectory) is not list:
+    if not isinstance(trajectory, list):
         logger.error(u"getSkinOfTrajectory(trajectory): trajectory has to be a list.")
         return []
 
@@ -1224,14 +1525,20 @@ def getSkinOfTrajectory(trajectory):
         logger.error(u"getSkinOfTrajectory(trajectory): trajectory needs at least two points.")
         return []
 
+    # Normalizes a 2D vector; a zero vector is returned unchanged (plain floats, since calling np.linalg.norm for
+    # every single vector took most of the time)
+    def normalize(vector):
+        length = math.sqrt(vector[0]*vector[0] + vector[1]*vector[1])
+        if length == 0:
+            return vector
+        return vector[0]/length, vector[1]/length
+
     # Two lists, for both sides of the skin (arbitrarily named left and right)
     skinleft = []
     skinright = []
 
     # Last slope = slope of first line
-    lastslope = (trajectory[1][0]-trajectory[0][0], trajectory[1][1]-trajectory[0][1])
-    if np.linalg.norm(lastslope) != 0:
-        lastslope /= np.linalg.norm(lastslope)
+    lastslope = normalize((trajectory[1][0]-trajectory[0][0], trajectory[1][1]-trajectory[0][1]))
 
     # For every point in the trajectory-list, calculate the two skinpoints
     for i in xrange(len(trajectory)):
@@ -1241,21 +1548,17 @@ def getSkinOfTrajectory(trajectory):
         # Calculate slope
         # Not last index? Take next slope
         if i < (len(trajectory)-1):
-            slope = (trajectory[i+1][0]-trajectory[i][0], trajectory[i+1][1]-trajectory[i][1])
-            if np.linalg.norm(slope) != 0:
-                slope /= np.linalg.norm(slope)
+            slope = normalize((trajectory[i+1][0]-trajectory[i][0], trajectory[i+1][1]-trajectory[i][1]))
 
         # Now combine the slopes to a skin-vector
-        skinvector = (slope[0] - lastslope[0], slope[1] - lastslope[1])
-        if np.linalg.norm(skinvector) != 0:
-            skinvector /= np.linalg.norm(skinvector)
+        skinvector = normalize((slope[0] - lastslope[0], slope[1] - lastslope[1]))
 
         # 1. special case: slope and lastslope are identical (first and last index)
         # 2. special case: slope and lastslope (and thus, the skinvector) are (anti)parallel
         # Both cases can be caught by looking at the cross product of slope and lastslope (will be zero)
-        # If so, then use just 90°-rotated lastslope
-        if np.cross(np.array(slope), np.array(lastslope)) == 0:
-            skinvector = (np.array([[0, -1], [1, 0]]).dot(np.array(lastslope)))
+        # If so, then use just 90°-rotated lastslope (the cross product is calculated directly on the scalars)
+        if abs(slope[0]*lastslope[1] - slope[1]*lastslope[0]) < 1e-12:
+            skinvector = (-lastslope[1], lastslope[0])
 
         # Calculate two points by adding and subtracting the skinvector, respectively
         pts = [(int(trajectory[i][0] + skinvector[0] * trajectory[i][2] / 2.0),
@@ -1264,7 +1567,7 @@ def getSkinOfTrajectory(trajectory):
                 int(trajectory[i][1] - skinvector[1] * trajectory[i][2] / 2.0))]
 
         # Check if the skinvector is on the left of slope-vector (by cross-product)
-        if np.cross(np.array(slope), np.array(skinvector)) > 0:
+        if slope[0]*skinvector[1] - slope[1]*skinvector[0] > 0:
             skinleft.append(pts[0])
             skinright.append(pts[1])
 
@@ -1300,8 +1603,8 @@ def calculateTrajectoriesOverlap(trac1, trac2):
         logger.warning(u"calculateTrajectoriesOverlap(trac1, trac2): empty trajectories given.")
         return 0.0
 
-    # The idea here is to render both trajectories with a basic rendering method to a RGB image; one trajectory
-    # is blue, the other one is red; the overlap is yellow - in the end, just have to count pixels!
+    # The idea here is to render both trajectories with a basic rendering method to a mask each; the overlap is
+    # where both masks are set - in the end, just have to count pixels!
 
     # First, calculate the bonding rect neeeded to draw both trajectories
     rect = calculateTrajectoryRectangle(trac1 + trac2)
@@ -1309,9 +1612,9 @@ def calculateTrajectoriesOverlap(trac1, trac2):
     # Calculate the width and height of this rectangle
     width, height = rect[1][0] - rect[0][0], rect[1][1] - rect[0][1]
 
-    # Create twp empty images, 24bit
-    image1 = np.zeros((height, width, 3), np.uint8)
-    image2 = np.zeros((height, width, 3), np.uint8)
+    # Create two empty masks, 8bit
+    mask1 = np.zeros((height, width), np.uint8)
+    mask2 = np.zeros((height, width), np.uint8)
 
     # Get the skins of the trajectories
     skin1 = np.array(getSkinOfTrajectory(trac1))
@@ -1326,24 +1629,21 @@ def calculateTrajectoriesOverlap(trac1, trac2):
     skin1 = np.subtract(skin1, np.array(rect[0]))
     skin2 = np.subtract(skin2, np.array(rect[0]))
 
-    # Draw the filled polygons, one in green, and one in red
-    cv2.fillPoly(image1, [skin1], (0, 255, 0))
-    cv2.fillPoly(image2, [skin2], (0, 0, 255))
+    # Draw the filled polygons
+    cv2.fillPoly(mask1, [skin1], 255)
+    cv2.fillPoly(mask2, [skin2], 255)
 
-    # Count green and red pixels in the corresponding images and sum up
-    green = cv2.countNonZero(cv2.inRange(image1, (0, 255, 0), (0, 255, 0)))
-    red = cv2.countNonZero(cv2.inRange(image2, (0, 0, 255), (0, 0, 255)))
+    # Count the pixels of both trajectories (green and red in the debug image)
+    green = cv2.countNonZero(mask1)
+    red = cv2.countNonZero(mask2)
 
     # No pixels?
     if min(green, red) == 0:
         logger.warning(u"calculateTrajectoriesOverlap(trac1, trac2): No trajectories were drawn; can't compare areas.")
         return 0.0
 
-    # Add both images
-    image1 = cv2.add(image1, image2)
-
-    # Count yellow pixels
-    yellow = cv2.countNonZero(cv2.inRange(image1, (0, 255, 255), (0, 255, 255)))
+    # Count the pixels of the overlap (yellow in the debug image)
+    yellow = cv2.countNonZero(cv2.bitwise_and(mask1, mask2))
 
     if debugmode:
         logger.debug("Overlap: %s, %s and %s, %s; %d, %d, %d, %.2f", str(trac1[0]), str(trac1[-1]),
@@ -1355,7 +1655,8 @@ def calculateTrajectoriesOverlap(trac1, trac2):
         return 0.0
 
     if debugmode:
-        cv2.imshow('Overlap', image1)
+        # One trajectory in green, the other one in red; the overlap is yellow
+        cv2.imshow('Overlap', cv2.merge((np.zeros_like(mask1), mask1, mask2)))
         cv2.waitKey(5000)
 
     # The overlap is basically yellow pixels over total pixels.
@@ -1390,6 +1691,7 @@ def calculateTrajectoriesDistanceHausdorff(trac1, trac2):
     pts2 = np.array([[x, y] for (x, y, d) in trac2])
 
     # Calculate distance matrix
+    import scipy.spatial.distance
     distance = scipy.spatial.distance.cdist(pts1, pts2, 'euclidean')
 
     # Calculate Hausdorff distance
@@ -1454,22 +1756,40 @@ def combineTrajectories(traclist1, traclist2, maxoverlap=0.75, useHausdorff=Fals
         logger.error(u"combineTrajectories(traclist1, traclist2, maxoverlap): maxoverlap has to be a float.")
         return []
 
-    # Our working list is the combination of both lists
-    workinglist = traclist1 + traclist2
+    # Our working list is the combination of both lists; every trajectory is paired with its bounding rectangle
+    workinglist = [(trajectory, calculateTrajectoryRectangle(trajectory) if len(trajectory) > 0 else [])
+                   for trajectory in traclist1 + traclist2]
+
+    # Two trajectories, whose bounding rectangles are more than this number of pixels apart, cannot be similar: the
+    # Hausdorff distance is at least the distance of the rectangles and there is no overlap between rectangles, which
+    # do not touch. Hence, they do not need to be compared. Exception: a maximum overlap of zero (everything is similar)
+    if useHausdorff:
+        maxgap = hausdorffbias
+    elif maxoverlap > 0.0:
+        maxgap = 0
+    else:
+        maxgap = None
 
     # Final list is empty at beginning
     finallist = []
 
     # As long as there is something in the working list do...
     while len(workinglist) > 0:
-        # Get and remove an item from this list
-        item = workinglist.pop()
+        # Get and remove an item (and its rectangle) from this list
+        item, itemrect = workinglist.pop()
 
         # Present in finallist?
         present = False
 
         # Check if this item or a similar one is already in the finallist
-        for finalitem in finallist:
+        for index, (finalitem, finalrect) in enumerate(finallist):
+            # Rectangles too far apart? Then this one is not similar (the end of the rectangles is exclusive)
+            if maxgap is not None and len(itemrect) > 0 and len(finalrect) > 0:
+                gap = max(finalrect[0][0] - itemrect[1][0], itemrect[0][0] - finalrect[1][0],
+                          finalrect[0][1] - itemrect[1][1], itemrect[0][1] - finalrect[1][1]) + 1
+                if gap > maxgap:
+                    continue
+
             # Check criteria for overlap
             if useHausdorff:
                 criteria = (calculateTrajectoriesDistanceHausdorff(item, finalitem) <= hausdorffbias)
@@ -1484,21 +1804,21 @@ def combineTrajectories(traclist1, traclist2, maxoverlap=0.75, useHausdorff=Fals
                 # Only, when this new trajectory from the working list is larger/longer then the one in the finallist
                 # we have the exchange them (overwrite)
                 if len(item) > len(finalitem):
-                    finallist[finallist.index(finalitem)] = item
+                    finallist[index] = (item, itemrect)
 
                 # In any case, break here
                 break
 
         # Only if the item (or sth similar) is not present already, we add it
         if not present:
-            finallist.append(item)
+            finallist.append((item, itemrect))
 
-    # Return the final list
-    return finallist
+    # Return the final list (without the rectangles)
+    return [finalitem for finalitem, finalrect in finallist]
 
 
 # Function: Finds a path between two points on a 8bit image
-def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, densityrad=4):
+def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, densityrad=4, densityimage=None):
     """Finds a path between `startpoint` and `endpoint` on a 8bit `image` using Dijkstra's algorithm. `bias` is the
     minimum intensity density a pixel must have to be considered as passable (otherwise its cost will be set to
     infinite). `densityrad` is the radius of the density field to calculate; 1 = 3x3 field, 2 = 5x5 field, etc
@@ -1507,6 +1827,9 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
     Although the algorithm can return every point in a path, this is not useful to get a smooth path. Therefore, it
     will only return every x. point, where x is given by `everyotherpoint` (default: 10).
 
+    `densityimage` can be given to use a density image already calculated by `ffe.getDensityImage` for `image` and
+    `densityrad` (default: None, i.e. calculate it here).
+
     Returns a list with the coordinates of the path (without widths) or an empty list if an error occurred.
     """
     global debugmode
@@ -1533,18 +1856,12 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
     # a little bit more real... a number, which the path cannot (or better: should not) reach.
     infinite = int(math.hypot(height, width)*100e6)
 
-    # Create an empty image for density calculations
-    densityimage = np.zeros((height, width), dtype=np.int32)
+    # Calculate the density (if not given)
+    if densityimage is None:
+        densityimage = getDensityImage(image, densityrad)
 
-    # Calculate the density
-    for x in xrange(width - 2 * densityrad):
-        for y in xrange(height - 2 * densityrad):
-            # The point in the middle should be not zero (we do not want to create points!)
-            if not image[y + densityrad, x + densityrad] == 0:
-                densityimage[y + densityrad, x + densityrad] = image[y:y + 2*densityrad, x:x + 2*densityrad].sum()
-
-    # Get maximum of this density-image (for cost calculations)
-    maxintensity = densityimage.max()
+    # Get maximum of this density-image (for cost calculations); as Python integer, so that the costs cannot overflow
+    maxintensity = int(densityimage.max())
 
     # Debug?
     if debugmode:
@@ -1554,7 +1871,7 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
                     densityimage[endpoint[1], endpoint[0]])
 
         # Rescale for showing
-        showdensity = rescaleFrameTo8bit(densityimage)
+        showdensity = rescaleFrameTo8bit(densityimage.astype(np.int32))
         # Convert to 24bit color
         showdensity = cv2.cvtColor(showdensity, cv2.COLOR_GRAY2BGR)
         cv2.circle(showdensity, (startpoint[0], startpoint[1]), 5, (0, 215, 255), -5)
@@ -1575,14 +1892,27 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
     # Get a list of all points above the bias (excluding!)
     points = np.transpose(np.where(densityimage > bias)).tolist()
 
-    # Create a list with tuples: (x, y, distance)
-    # Set all distances to infinite except for the startpoint
-    queue = []
-    for pt in points:
-        distance = infinite
-        if pt[1] == startpoint[0] and pt[0] == startpoint[1]:
-            distance = 0
-        heapq.heappush(queue, (distance, pt[1], pt[0]))
+    # Index of every point in the list (for backtracking); key is the coordinate (x, y)
+    pointindex = {(pt[1], pt[0]): i for i, pt in enumerate(points)}
+
+    # Set all distances to infinite; points, which are not in this dictionary, are not passable
+    distances = dict.fromkeys(pointindex, infinite)
+
+    # The costs are integers between 0 and maxintensity, so instead of one big heap queue, a circular array of buckets
+    # is used (Dial's algorithm): an item with distance d goes into bucket d % nbuckets. Every bucket is a (small) heap
+    # queue of tuples (distance, x, y) by itself, so that points with the same distance are visited in the same order
+    # as by a single heap queue. A point, which gets a shorter distance, is simply queued again and its outdated item
+    # skipped later; an indexed heap with a decrease-key operation would have to be written in Python and costs more
+    # per operation than heapq saves on the few outdated items.
+    nbuckets = maxintensity + 1
+    buckets = [[] for _ in xrange(nbuckets)]
+    queuelength = 0
+
+    # Only the startpoint starts with zero distance
+    if (startpoint[0], startpoint[1]) in distances:
+        distances[(startpoint[0], startpoint[1])] = 0
+        buckets[0].append((0, startpoint[0], startpoint[1]))
+        queuelength = 1
 
     # Create an empty "image", which holds the indices for backtracking
     tracker = np.zeros((height, width), dtype=np.int32)
@@ -1590,49 +1920,50 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
     # Give the end point a negative index
     tracker[endpoint[1], endpoint[0]] = -1
 
+    # Distance of the current bucket
+    currentdistance = 0
+
     # As long this queue is not empty, do...
-    while len(queue) > 0:
+    while queuelength > 0:
+        # Current bucket empty? Then go to the next one
+        bucket = buckets[currentdistance % nbuckets]
+        if len(bucket) == 0:
+            currentdistance += 1
+            continue
+
         # Pop (get and remove) item with smallest distance in queue
-        firstitem = heapq.heappop(queue)
+        firstitem = heapq.heappop(bucket)
+        queuelength -= 1
+
+        # Outdated item (the point was queued again with a shorter distance)? Then skip it
+        if firstitem[0] != distances[(firstitem[1], firstitem[2])]:
+            continue
 
         # Endpoint reached?
         if firstitem[1] == endpoint[0] and firstitem[2] == endpoint[1]:
             break
 
-        # Find all neighbours of firstitem in queue
-        neighbours = [node for node in queue if int(math.hypot(node[1]-firstitem[1], node[2]-firstitem[2])) == 1]
-
-        needtoheapify = False
+        # Update the distance of all neighbours of firstitem (the eight pixels around it); points already visited
+        # cannot get a shorter distance anymore
+        for (dx, dy) in neighbouroffsets:
+            neighbour = (firstitem[1] + dx, firstitem[2] + dy)
+            if neighbour not in distances:
+                continue
 
-        # Update the distance of these neighbours
-        for neighbour in neighbours:
             # The higher the intensity of the pixel, the lower the cost
-            cost = (maxintensity - densityimage[neighbour[2], neighbour[1]])
+            cost = (maxintensity - int(densityimage[neighbour[1], neighbour[0]]))
 
             # Calculate a distance: base distance from first item plus its cost
             altdistance = firstitem[0] + cost
 
-            # Shorter? Then update!
-            if altdistance < neighbour[0]:
-                # Create new tuple
-                updneighbour = (altdistance, neighbour[1], neighbour[2])
-
-                # Delete old version
-                del queue[queue.index(neighbour)]
-
-                # Deletion of item is INVARIANT to a heap queue, so mark for re-heapifying
-                needtoheapify = True
-
-                # Push new version
-                heapq.heappush(queue, updneighbour)
+            # Shorter? Then update and queue the neighbour (again)
+            if altdistance < distances[neighbour]:
+                distances[neighbour] = altdistance
+                heapq.heappush(buckets[altdistance % nbuckets], (altdistance, neighbour[0], neighbour[1]))
+                queuelength += 1
 
                 # Update the tracker
-                tracker[neighbour[2], neighbour[1]] = points.index(
-                    next(item for item in points if item[1] == firstitem[1] and item[0] == firstitem[2]))
-
-        # Need to heapify again? (i.e. item was deleted)
-        if needtoheapify:
-            heapq.heapify(queue)
+                tracker[neighbour[1], neighbour[0]] = pointindex[(firstitem[1], firstitem[2])]
 
     # Give the start point a negative index (just in case)
     tracker[startpoint[1], startpoint[0]] = -1
@@ -1646,7 +1977,7 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
     path = [[endpoint[0], endpoint[1]]]
 
     # Fill the list
-    current = next(item for item in points if item[1] == endpoint[0] and item[0] == endpoint[1])
+    current = points[pointindex[(endpoint[0], endpoint[1])]]
 
     # Count items
     n = 0
@@ -1679,7 +2010,7 @@ def findPathOnImage(image, startpoint, endpoint, bias=50, everyotherpoint=10, de
 
 # Function: Find trajectories on 8bit image, given the start and endpoints, by using pathfinding
 def getTrajectoriesFromImageDijkstra(image, startpoints, endpoints, bias=50, everyotherpoint=10, densityrad=4,
-                                     spvariancefactor=2):
+                                     spvariancefactor=2, densityimage=None):
     """Finds trajectories on a 8bit `image` using Dijkstra's algorithm. It will subsequently check for a path between
     every start and end point given by `startpoints` and `endpoints`.
 
@@ -1689,7 +2020,8 @@ def getTrajectoriesFromImageDijkstra(image, startpoints, endpoints, bias=50, eve
     to an empty pixel. In this case, a point near this coordinate is looked for, which has intensity density above
     `bias` and is not more than `width*spvariancefactor` pixels away. If found, this point will be used instead.
 
-    For an explanation of `bias`, `everyotherpoint`, and `densityrad`, see `ffe.findPathOnImage`.
+    For an explanation of `bias`, `everyotherpoint`, `densityrad`, and `densityimage`, see `ffe.findPathOnImage`. The
+    density image is calculated only once for all searches.
 
     Returns a trajectory list of coordinates and a standard width in the form of `(x, y, w)`.
     """
@@ -1715,6 +2047,10 @@ def getTrajectoriesFromImageDijkstra(image, startpoints, endpoints, bias=50, eve
         logger.error(u"getTrajectoriesFromImageDijkstra(image, ...): image is empty.")
         return []
 
+    # Calculate the density once for all searches (if not given)
+    if densityimage is None:
+        densityimage = getDensityImage(image, densityrad)
+
     # Create empty array of trajectories
     trajectories = []
 
@@ -1740,13 +2076,13 @@ def getTrajectoriesFromImageDijkstra(image, startpoints, endpoints, bias=50, eve
                         (startpoint[2]*spvariancefactor):
                     startpoint = (points[0][0], points[0][1], startpoint[2])
 
-            starttime = time.clock()
+            starttime = timer()
             # Create empty array for the trajectory
-            path = findPathOnImage(image, endpoint, startpoint, bias, everyotherpoint, densityrad)
-            endtime = time.clock()
+            path = findPathOnImage(image, endpoint, startpoint, bias, everyotherpoint, densityrad, densityimage)
+            endtime = timer()
 
             if debugmode:
-                logger.info(u"Time needed: %.3f seconds" % (endtime-starttime))
+                logger.info(u"Time needed: %.3f seconds", endtime - starttime)
 
             # Append
             if len(path) > 0:
@@ -1758,9 +2094,10 @@ def getTrajectoriesFromImageDijkstra(image, startpoints, endpoints, bias=50, eve
 
 
 # Function: Determines the widths of a stream trajectory
-def findWidthOfTrajectory(image, trajectory, densityrad=1):
+def findWidthOfTrajectory(image, trajectory, densityrad=1, densityimage=None):
     """Extracts the widths of a `trajectory` out of `image`. `densityrad` is the radius of the density field
-    to calculate; 1 = 3x3 field, 2 = 5x5 field, etc (default: 1).
+    to calculate; 1 = 3x3 field, 2 = 5x5 field, etc (default: 1). `densityimage` can be given to use a density image
+    already calculated by `ffe.getDensityImage` for `image` and `densityrad` (default: None, i.e. calculate it here).
 
     Returns the `trajectory` as list with determined widths or an empty list if an error occurred. Will not modify
     the coordinates.
@@ -1780,18 +2117,16 @@ def findWidthOfTrajectory(image, trajectory, densityrad=1):
         logger.error(u"findWidthOfTrajectory(image, trajectory): trajectory needs at least two points.")
         return []
 
+    # For finding the minima and fitting the splines
+    import scipy.signal
+    import scipy.interpolate
+
     # Get dimensions of image
     height, width = image.shape
 
-    # Create an empty image for density calculations
-    densityimage = np.zeros((height, width), dtype=np.int32)
-
-    # Calculate the density
-    for x in xrange(width - 2 * densityrad):
-        for y in xrange(height - 2 * densityrad):
-            # The point in the middle should be not zero (we do not want to create points!)
-            if not image[y + densityrad, x + densityrad] == 0:
-                densityimage[y + densityrad, x + densityrad] = image[y:y + 2 * densityrad, x:x + 2 * densityrad].sum()
+    # Calculate the density (if not given)
+    if densityimage is None:
+        densityimage = getDensityImage(image, densityrad)
 
     # Maximum width (half height of image probably is never reached)
     maxwidth = int(height / 2)
@@ -1824,9 +2159,9 @@ def findWidthOfTrajectory(image, trajectory, densityrad=1):
         # 1. special case: slope and lastslope are identical (first and last index)
         # 2. special case: slope and lastslope (and thus, the skinvector) are (anti)parallel
         # Both cases can be caught by looking at the cross product of slope and lastslope (will be zero)
-        # If so, then use just 90°-rotated lastslope
-        if np.cross(np.array(slope), np.array(lastslope)) == 0:
-            skinvector = (np.array([[0, -1], [1, 0]]).dot(np.array(lastslope)))
+        # If so, then use just 90°-rotated lastslope (the cross product is calculated directly on the scalars)
+        if abs(slope[0]*lastslope[1] - slope[1]*lastslope[0]) < 1e-12:
+            skinvector = (-lastslope[1], lastslope[0])
 
         # Calculate two points far away from the target point on the line given by skinvector and maxwidth
         w1 = (trajectory[i][0] + maxwidth * skinvector[0],
@@ -1838,23 +2173,18 @@ def findWidthOfTrajectory(image, trajectory, densityrad=1):
         wdistance = int(np.hypot(w1[0] - w2[0], w1[1] - w2[1]))
 
         # Get all the pixel coordinates along this line
-        wpoints = np.transpose([np.linspace(w1[0], w2[0], wdistance).astype(np.int),
-                                np.linspace(w1[1], w2[1], wdistance).astype(np.int)])
-
-        # Values along this line
-        wvalues = []
-        for x, y in wpoints:
-            if 0 <= x < width and 0 <= y < height:
-                wvalues.append(densityimage[y, x])
-            else:
-                wvalues.append(0)
+        wpoints = np.transpose([np.linspace(w1[0], w2[0], wdistance).astype(int),
+                                np.linspace(w1[1], w2[1], wdistance).astype(int)])
 
-        # If wvalues is zero: continue with next point
-        if len(wvalues) == 0:
+        # If there are no points: continue with next point
+        if len(wpoints) == 0:
             continue
 
-        # Convert to numpy array
-        wvalues = np.array(wvalues)
+        # Values along this line (all at once); points outside of the image are zero. Use a signed numpy array, since
+        # the values are shifted below zero later on
+        inside = ((0 <= wpoints[:, 0]) & (wpoints[:, 0] < width) & (0 <= wpoints[:, 1]) & (wpoints[:, 1] < height))
+        wvalues = np.zeros(len(wpoints), dtype=np.int32)
+        wvalues[inside] = densityimage[wpoints[inside, 1], wpoints[inside, 0]]
 
         # Standard stream width is zero
         streamwidth = 0
@@ -1865,8 +2195,11 @@ def findWidthOfTrajectory(image, trajectory, densityrad=1):
         # Divide the data point array into two subarrays, for the left (inverted) and right side
         wvaluesleft, wvaluesright = wvalues[midindex:0:-1], wvalues[midindex:]
 
-        # Find the first indices where the value becomes zero
-        indexleft, indexright = np.argwhere(wvaluesleft == 0)[0][0], np.argwhere(wvaluesright == 0)[0][0]
+        # Find the first indices where the value becomes zero (argmax stops at the first True); if there is no zero,
+        # use the last index
+        zeroleft, zeroright = (wvaluesleft == 0), (wvaluesright == 0)
+        indexleft = int(np.argmax(zeroleft)) if zeroleft.any() else len(wvaluesleft) - 1
+        indexright = int(np.argmax(zeroright)) if zeroright.any() else len(wvaluesright) - 1
 
         # Now create a new array with the combined values
         wvalues = np.append(wvaluesleft[indexleft:0:-1], wvaluesright[0:indexright + 1])
@@ -1891,14 +2224,15 @@ def findWidthOfTrajectory(image, trajectory, densityrad=1):
                 base = max(wvalues[indices[g]], wvalues[indices[g + 1]])
 
                 # Change wvalues a little bit, only care about the region of interest
-                wvalues = np.array([item - base if indices[g] <= index <= indices[g + 1] and item > base else 0 for index, item
-                                    in enumerate(wvalues)])
+                roi = np.arange(len(wvalues))
+                roi = (indices[g] <= roi) & (roi <= indices[g + 1]) & (wvalues > base)
+                wvalues = np.where(roi, wvalues - base, 0)
 
         # We need at least four values to be able to try to find a spline-approximation with k=3 (cubic)
         if len(wvalues) > 4:
             # We want to find the Full Width At Half Maximum, i.e. the data has to be shifted by the half maximum
             # Then, a spline (cubic, k=3) is used to approximate these data points
-            spline = scipy.interpolate.UnivariateSpline(list(range(len(wvalues))), wvalues - wvalues.max()/2, ext=1)
+            spline = scipy.interpolate.UnivariateSpline(list(range(len(wvalues))), wvalues - wvalues.max() // 2, ext=1)
 
             # Since the Half Height is now on y=0, all we need is to determine the zeros (roots)
             # Ideally, there should only be two; the difference is the width of the stream
@@ -1925,12 +2259,13 @@ def findWidthOfTrajectory(image, trajectory, densityrad=1):
             cv2.imshow('Slicing', debugimage)
 
             # Plot values
+            import matplotlib.pyplot as plt
             plt.plot(wvalues, 'ro-')
 
             # Plot spline (if possible)
             if len(wvalues) > 4:
                 spline = scipy.interpolate.UnivariateSpline(list(range(len(wvalues))),
-                                                            wvalues - wvalues.max() / 2, ext=1)
+                                                            wvalues - wvalues.max() // 2, ext=1)
 
                 xs = np.linspace(0, len(wvalues), 1000)
                 plt.plot(xs, spline(xs), 'g', lw=2)
@@ -2066,47 +2401,73 @@ def sortTrajectoriesByWeightedCoordinates(trajectories):
 # Function: Get y and width of a trajectory as a function of x
 def getYandWofTrajectory(trajectory, x):
     """Gets the y-coordinate and the width of `trajectory` as a function of `x` (interpolated by a spline).
-    Returns a tuple in the form of `(y, w)`.
+    Returns a tuple in the form of `(y, w)`. See `ffe.getYandWofTrajectoryArray` for evaluating many x at once.
+    """
+    # Evaluate the array version with a single x
+    ys, ws = getYandWofTrajectoryArray(trajectory, np.array([x]))
+
+    # Return values as tuple
+    return (ys[0], ws[0])
+
+
+# Function: Get y and width of a trajectory for an array of x
+def getYandWofTrajectoryArray(trajectory, xs):
+    """Gets the y-coordinates and the widths of `trajectory` for every x in `xs` (interpolated by splines). The splines
+    are fitted only once, so this is much faster than calling `ffe.getYandWofTrajectory` for every x.
+
+    Returns a tuple of two numpy arrays in the form of `(ys, ws)`. A width of `-1` means that no width could be
+    determined for this x (<i>e.g.</i> x is outside of the trajectory).
     """
+    # Convert to a numpy array of floats
+    xs = np.asarray(xs, dtype=np.float64)
+
+    # Default values are (0, -1)
+    ys = np.zeros(len(xs))
+    ws = np.full(len(xs), -1.0)
+
     # Is trajectory a list?
-    if type(trajectory) is not list:
-        logger.error(u"getYandWofTrajectory(...): trajectory has to be a list.")
-        return (0, -1)
+    if not isinstance(trajectory, list):
+        logger.error(u"getYandWofTrajectoryArray(...): trajectory has to be a list.")
+        return ys, ws
 
     # We will be using cubic trajectories, so we need at least 3 points
     if len(trajectory) < 4:
-        return (0, -1)
+        return ys, ws
 
     # Get only x and y points of the trajectory
     points = np.array([(item[0], item[1]) for item in trajectory]).transpose()
 
-    # Should x be outside of the boundary, return (0, -1)
-    if not min(points[0]) <= x <= max(points[0]):
-        return (0, -1)
-
-    # Fit by spline
-    spline = scipy.interpolate.InterpolatedUnivariateSpline(points[0], points[1], ext=3)
-
-    # Get Y of spline(x)
-    y = spline(x)
+    # Only x inside of the boundary are evaluated; the others stay (0, -1)
+    inside = (points[0].min() <= xs) & (xs <= points[0].max())
+    if not inside.any():
+        return ys, ws
 
     # For the widths, we use the skin of the trajectory
     skin = getSkinOfTrajectory(trajectory)
 
     # Length should be a multiple of two
     if not len(skin) % 2 == 0:
-        return (0, -1)
+        return ys, ws
+
+    # Fit by spline
+    import scipy.interpolate
+    spline = scipy.interpolate.InterpolatedUnivariateSpline(points[0], points[1], ext=3)
+
+    # Get Y of spline(x)
+    ys[inside] = spline(xs[inside])
 
     # Length of half list
     halflen = int(len(skin)/2)
 
     # Separate into two lists, remove duplicates by dict, and invert the second one
-    skinleft = np.array(dict(skin[:halflen-1]).items()).transpose()
-    skinright = np.array(dict((skin[halflen:])[::-1]).items()).transpose()
+    skinleft = np.array(list(dict(skin[:halflen-1]).items())).transpose()
+    skinright = np.array(list(dict((skin[halflen:])[::-1]).items())).transpose()
 
-    # Should x be outside of the boundary, return (Y, -1)
-    if not min(skinleft[0]) <= x <= max(skinleft[0]) or not min(skinright[0]) <= x <= max(skinright[0]):
-        return (y, -1)
+    # Should x be outside of the boundary, the width stays -1
+    inside &= (skinleft[0].min() <= xs) & (xs <= skinleft[0].max())
+    inside &= (skinright[0].min() <= xs) & (xs <= skinright[0].max())
+    if not inside.any():
+        return ys, ws
 
     # This makes sure that points are in ascending order (increasing)!
     skinleft = skinleft[:, skinleft.argsort()[0]]
@@ -2117,57 +2478,79 @@ def getYandWofTrajectory(trajectory, x):
         splineleft = scipy.interpolate.UnivariateSpline(skinleft[0], skinleft[1], ext=3)
         splineright = scipy.interpolate.UnivariateSpline(skinright[0], skinright[1], ext=3)
 
-        # If there is a warning, return (y, -1)
+        # If there is a warning, the widths stay -1
         if len(warn) > 0:
-            return (y, -1)
+            return ys, ws
 
     # The width is now the difference
-    W = abs(splineleft(x)-splineright(x))
+    ws[inside] = np.abs(splineleft(xs[inside])-splineright(xs[inside]))
 
-    # is W some NaN? Infinite?
-    if math.isnan(W) or math.isinf(W):
-        W = -1
+    # Are some W NaN? Infinite?
+    ws[~np.isfinite(ws)] = -1
 
     # Return values as tuple
-    return (y, W)
+    return ys, ws
 
 
 # Function: Calculates the resolution of two trajectories as function of x
 def getResolutionOfTrajectories(trajectory1, trajectory2, x):
     """Calculates the resolution between `trajectory1` and `trajectory2` as a function of `x`. Uses
-    `ffe.getYandWofTrajectory` to get the y-coordinate and width at `x`.
+    `ffe.getYandWofTrajectory` to get the y-coordinate and width at `x`. See `ffe.getResolutionOfTrajectoriesArray`
+    for evaluating many x at once.
 
     Returns the resolution as `float`.
     """
-    # Are trajectories lists?
-    if type(trajectory1) is not list or type(trajectory2) is not list:
-        logger.error(u"getResolutionOfTrajectories(...): trajectories have to be lists.")
-        return 0
+    # Evaluate the array version with a single x
+    return float(getResolutionOfTrajectoriesArray(trajectory1, trajectory2, np.array([x]))[0])
 
-    # Get x coordinates of trajectories
-    xpoints1 = [item[0] for item in trajectory1]
-    xpoints2 = [item[0] for item in trajectory2]
 
-    # Is x outside of the boundaries of any of the trajectory? Then return zero.
-    if not min(xpoints1) <= x <= max(xpoints1) or not min(xpoints2) <= x <= max(xpoints2):
-        return 0
+# Function: Calculates the resolution of two trajectories for an array of x
+def getResolutionOfTrajectoriesArray(trajectory1, trajectory2, xs):
+    """Calculates the resolution between `trajectory1` and `trajectory2` for every x in `xs`. Uses
+    `ffe.getYandWofTrajectoryArray` to get the y-coordinates and widths, i.e. the splines of each trajectory are only
+    fitted once.
+
+    Returns the resolutions as numpy array of floats (zero, where no resolution could be calculated).
+    """
+    # Convert to a numpy array of floats
+    xs = np.asarray(xs, dtype=np.float64)
+
+    # Resolutions are zero by default
+    res = np.zeros(len(xs))
+
+    # Are trajectories lists?
+    if not isinstance(trajectory1, list) or not isinstance(trajectory2, list):
+        logger.error(u"getResolutionOfTrajectoriesArray(...): trajectories have to be lists.")
+        return res
 
     # Get Y and W of first trajectory
-    Y1, W1 = getYandWofTrajectory(trajectory1, x)
+    Y1, W1 = getYandWofTrajectoryArray(trajectory1, xs)
 
     # Get Y and W of second trajectory
-    Y2, W2 = getYandWofTrajectory(trajectory2, x)
+    Y2, W2 = getYandWofTrajectoryArray(trajectory2, xs)
+
+    # Calculate and return resolution
+    return getResolutionOfYandW(Y1, W1, Y2, W2)
 
-    # If both widths are zero, return zero
-    if W2 == W1 == 0:
-        return 0
 
-    # If one of the widths is less than zero, return zero
-    if W1 < 0 or W2 < 0:
-        return 0
+# Function: Calculates the resolution from the y-coordinates and widths of two trajectories
+def getResolutionOfYandW(Y1, W1, Y2, W2):
+    """Calculates the resolution between two trajectories from their y-coordinates `Y1`, `Y2` and widths `W1`, `W2`
+    (numpy arrays of the same shape as returned by `ffe.getYandWofTrajectoryArray`). Useful to compare many
+    trajectories with each other, since every trajectory has to be evaluated only once. The arrays can also be 2D with
+    one row per pair of trajectories to calculate the resolutions of many pairs at once.
+
+    Returns the resolutions as numpy array of floats (zero, where no resolution could be calculated).
+    """
+    # Resolutions are zero by default
+    res = np.zeros(np.shape(Y1))
+
+    # If both widths are zero or one of the widths is less than zero, the resolution stays zero; this includes every
+    # x outside of the boundaries of any of the trajectories (width is -1 there)
+    valid = (W1 >= 0) & (W2 >= 0) & ~((W1 == 0) & (W2 == 0))
 
-    # Calculate resolution
-    res = float(abs(float(Y1-Y2))/(0.5*float(W1 + W2)))
+    # Calculate resolution; divide only where valid, directly into res (no copies of the masked values)
+    np.divide(np.abs(Y1 - Y2), 0.5*(W1 + W2), out=res, where=valid)
 
     # Return resolution
     return res
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -20,181 +20,164 @@
 # Import modules
 import cv2              # OpenCV
 import numpy as np      # Numpy - You always need this.
-import ConfigParser     # Reading/Writing config files
 import ffe              # frequently-used function script
 import time             # Time functions
 import sys              # Sys functions
 import logging          # Logging functions
+import logging.handlers  # Buffered logging (file output)
 import os               # OS functions
 import png              # Raw PNG read/write functions
 import shutil           # High level file operations (needed for copy at end)
-import getopt           # Get and parse command-line arguments
-import copy             # Make 1:1 copies of whole objects (numpy/opencv do not copy objects - they use references)
+import argparse         # Get and parse command-line arguments
 
-# Function: Prints help page
+# Indices of the channels in a (BGR) image
+channelindices = {"blue": 0, "green": 1, "red": 2}
+
+# Formats of the log file and of the console output
+fileformatter = logging.Formatter('%(asctime)s\t%(filename)s\t%(levelname)s\t%(lineno)d\t%(message)s')
+consoleformatter = logging.Formatter('%(message)s')
+
+
+# Function: Parses an intensity (integer in the range of 0 and 255) for argparse
+# --------------------------------------------------------------------------------------------------------------------
+def parseIntensity(arg):
+    try:
+        value = int(arg)
+    except ValueError:
+        value = -1
+
+    if not 0 <= value < 256:
+        raise argparse.ArgumentTypeError("must be a integer in the range of 0 and 255. '%s' was given" % str(arg))
+
+    return value
+
+
+# Function: Parses a float in the range of 0.00 and 1.00 for argparse
+# --------------------------------------------------------------------------------------------------------------------
+def parseUnitFloat(arg):
+    try:
+        value = float(arg)
+    except ValueError:
+        value = -1.0
+
+    if not 0.00 <= value <= 1.00:
+        raise argparse.ArgumentTypeError("must be a float in the range of 0.00 and 1.00. '%s' was given" % str(arg))
+
+    return value
+
+
+# Function: Writes an intermediate image as debugNNN.png and shows it (only in debug mode)
 # --------------------------------------------------------------------------------------------------------------------
-def printHelpPage():
-    print("USAGE: script.py [options] --input-file <file>")
-    print("")
-
-    print("Order of options is not important. The input file is mandatory.")
-    print("")
-
-    print("Switches:")
-    print("\t--help:\t\t\t\t\t\tShows this help page.")
-    print("\t--debug:\t\t\t\t\tActivate debug mode output of intermediate pictures as debugNNN.png and preview.")
-    print("\t--skip-flowmarkers:\t\t\tDo not look for flowmarkers.")
-    print("\t--silent:\t\t\t\t\tDo not show anything in the console (except parameter errors).")
-    print("")
-
-    print("Options:")
-    print("\t--input-file <file>\t\t\tInput file. <file> should be a PNG-file.")
-    print("\t--channel <channel>\t\t\tUses only <channel> for feature finding. Default: All channels are used. "
-          "<channel> can be blue, green, or red.")
-    print("\t--thresh-binary ##\t\t\tThreshold for creating the binary picture. Default: 45. Range: 0-255.")
-    print("\t--sepzone-area #.##\t\t\tThreshold for the area the separation zone must have at least given as fraction "
-          "of the total pixels in the image. Default: 0.25. Range: 0.00-1.00.")
-    print("\t--sepzone-ratio #.##\t\tRatio of area(inner contour)/area(outer contour) for detection of "
-          "separation zone. Default: 0.8. Range: 0.00-1.00.")
-    print("\t--sepzone-variance #.##\t\tVariance of above ratio. Default: 0.05. Range: 0.00-1.00.")
-    print("\t--flowmarker-variance #.##\tVariance of marker area between the two flow markers. "
-          "Default: 0.05. Range: 0.00-1.00.")
-    print("\t--epsilon #.##\t\t\t\tEpsilon for refining the contours after detection. Default: 0.01. Range: 0.00-1.00")
-    print("")
+def showDebugImage(image):
+    global debugcounter
+
+    if debugmode:
+        debugcounter = ffe.debugWriteImage(image, debugcounter)
+        cv2.imshow('Showcase', image)
 
 
 # Step 0: Parse command-line arguments
 # --------------------------------------------------------------------------------------------------------------------
+parser = argparse.ArgumentParser(usage="script.py [options] --input-file <file>",
+                                 description="Order of options is not important. The input file is mandatory.")
+
+# Switches
+parser.add_argument("--debug", action="store_true",
+                    help="Activate debug mode output of intermediate pictures as debugNNN.png and preview.")
+parser.add_argument("--auto-threshold", action="store_true",
+                    help="Determine the threshold for the binary picture from the histogram of the gray image (Otsu's "
+                         "method) instead of using --thresh-binary.")
+parser.add_argument("--skip-flowmarkers", action="store_true", help="Do not look for flowmarkers.")
+parser.add_argument("--silent", action="store_true",
+                    help="Do not show anything in the console (except parameter errors).")
+
+# Options
+parser.add_argument("--input-file", required=True, metavar="<file>", help="Input file. <file> should be a PNG-file.")
+parser.add_argument("--channel", choices=sorted(channelindices), default="", metavar="<channel>",
+                    help="Uses only <channel> for feature finding. Default: All channels are used. <channel> can be "
+                         "blue, green, or red.")
+parser.add_argument("--thresh-binary", type=parseIntensity, default=45, metavar="##",
+                    help="Threshold for creating the binary picture. Default: 45. Range: 0-255.")
+parser.add_argument("--sepzone-area", type=parseUnitFloat, default=0.25, metavar="#.##",
+                    help="Threshold for the area the separation zone must have at least given as fraction of the "
+                         "total pixels in the image. Default: 0.25. Range: 0.00-1.00.")
+parser.add_argument("--sepzone-ratio", type=parseUnitFloat, default=0.8, metavar="#.##",
+                    help="Ratio of area(inner contour)/area(outer contour) for detection of separation zone. "
+                         "Default: 0.8. Range: 0.00-1.00.")
+parser.add_argument("--sepzone-variance", type=parseUnitFloat, default=0.05, metavar="#.##",
+                    help="Variance of above ratio. Default: 0.05. Range: 0.00-1.00.")
+parser.add_argument("--flowmarker-variance", type=parseUnitFloat, default=0.05, metavar="#.##",
+                    help="Variance of marker area between the two flow markers. Default: 0.05. Range: 0.00-1.00.")
+parser.add_argument("--epsilon", type=parseUnitFloat, default=0.01, metavar="#.##",
+                    help="Epsilon for refining the contours after detection. Default: 0.01. Range: 0.00-1.00.")
+
+# Collect the user input (shows the help page and exits on errors)
+arguments = parser.parse_args()
+
 # Debug mode
-debugmode = False
+debugmode = arguments.debug
 debugcounter = 1
 
 # Silent mode: Log only to file
-silentmode = False
+silentmode = arguments.silent
 
 # Inputfile
-inputfile = ""
+inputfile = arguments.input_file
 
 # Channel to use (default = blank, which means: use complete image)
-singlechannel = ""
+singlechannel = arguments.channel
 
 # Several thresh parameters
-threshbinary = 45  # Bias for binary picture (everything above 45 = white)
-thresharea = 0.25  # The separation zone takes up at least 25% of the whole area on the image.
-threshratio = 0.8  # area(child)/area(parent)
-variance_zone = 0.05  # The variance of the ratio of areas
-variance_marker = 0.05  # Variance of marker area between the two flow markers
-epsilon = 0.01  # For refining the contours of the separation zone boxes
+threshbinary = arguments.thresh_binary  # Bias for binary picture (everything above 45 = white)
+thresharea = arguments.sepzone_area  # The separation zone takes up at least 25% of the whole area on the image.
+threshratio = arguments.sepzone_ratio  # area(child)/area(parent)
+variance_zone = arguments.sepzone_variance  # The variance of the ratio of areas
+variance_marker = arguments.flowmarker_variance  # Variance of marker area between the two flow markers
+epsilon = arguments.epsilon  # For refining the contours of the separation zone boxes
+
+# Use Otsu's method for the binary picture instead of threshbinary?
+autothreshold = arguments.auto_threshold
 
 # Skip looking for flow marker?
-skip_flowmarkers = False
-
-# No parameters given?
-if len(sys.argv) == 1:
-    printHelpPage()
-    sys.exit(1)
-
-# Try to find all the arguments
-try:
-    # All the options to recognize
-    opts, args = getopt.getopt(sys.argv[1:], "", ["help", "input-file=", "thresh-binary=", "sepzone-area=",
-                                                  "debug", "sepzone-ratio=", "sepzone-variance=",
-                                                  "flowmarker-variance=", "skip-flowmarkers", "silent", "channel=",
-                                                  "epsilon="])
-# Found something unexpected? Display help page!
-except getopt.GetoptError as parametererror:
-    print("ERROR: %s." % parametererror.msg)
-    printHelpPage()
-    sys.exit(2)
-
-# Otherwise, collect the user input
-for opt, arg in opts:
-    if opt == '--help':
-        printHelpPage()
-        sys.exit(0)
-    elif opt == "--input-file":
-        inputfile = arg
-    elif opt == "--debug":
-        debugmode = True
-    elif opt == "--skip-flowmarkers":
-        skip_flowmarkers = True
-    elif opt == "--silent":
-        silentmode = True
-    elif opt == "--thresh-binary":
-        if 0 <= int(arg) < 256:
-            threshbinary = int(arg)
-        else:
-            print("Threshbinary must be a integer in the range of 0 and 255. '%s' was given." % str(arg))
-            sys.exit(0)
-    elif opt == "--sepzone-area":
-        if 0.00 <= float(arg) <= 1.00:
-            thresharea = float(arg)
-        else:
-            print("Threshold area must be a float in the range of 0.00 and 1.00. '%s' was given." % str(arg))
-            sys.exit(0)
-    elif opt == "--sepzone-ratio":
-        if 0.00 <= float(arg) <= 1.00:
-            threshratio = float(arg)
-        else:
-            print("Threshold ratio must be a float in the range of 0.00 and 1.00. '%s' was given." % str(arg))
-            sys.exit(0)
-    elif opt == "--flowmarker-variance":
-        if 0.00 <= float(arg) <= 1.00:
-            variance_marker = float(arg)
-        else:
-            print("Variance_marker must be a float in the range of 0.00 and 1.00. '%s' was given." % str(arg))
-            sys.exit(0)
-    elif opt == "--sepzone-variance":
-        if 0.00 <= float(arg) <= 1.00:
-            variance_zone = float(arg)
-        else:
-            print("Variance_zone must be a float in the range of 0.00 and 1.00. '%s' was given." % str(arg))
-            sys.exit(0)
-    elif opt == "--channel":
-        if arg in ["blue", "green", "red"]:
-            singlechannel = arg
-        else:
-            print("Channel has to be one of: blue, green, or red. '%s' was given." % str(arg))
-            sys.exit(0)
-    elif opt == "--epsilon":
-        if 0.00 <= float(arg) <= 1.00:
-            epsilon = float(arg)
-        else:
-            print("Epsilon must be a float in the range of 0.00 and 1.00. '%s' was given." % str(arg))
-            sys.exit(0)
+skip_flowmarkers = arguments.skip_flowmarkers
 
 # No input file given?
 if len(inputfile) == 0:
-    print("No input file given.")
-    printHelpPage()
-    sys.exit(1)
+    parser.error("no input file given")
 
 # Step 1: Setup logging
 # --------------------------------------------------------------------------------------------------------------------
 # Create logger object for this script
 logger = logging.getLogger('FFE')
 
-# Set level of information
-logger.setLevel(logging.DEBUG)
+# Thread and process information is not used by the formats above; do not collect it for every record
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# Set level of information; debug messages are only recorded (and formatted) in debug mode
+logger.setLevel(logging.DEBUG if debugmode else logging.INFO)
 
 # Create log file handler which records everything; append the new information
 fh = logging.FileHandler('evaluating.log', mode='a')
 fh.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s\t%(filename)s\t%(levelname)s\t%(lineno)d\t%(message)s')
-fh.setFormatter(formatter)
-logger.addHandler(fh)
+fh.setFormatter(fileformatter)
+
+# Buffer the records for the file and write them in blocks (errors immediately); the rest is written when logging is
+# shut down at exit
+mh = logging.handlers.MemoryHandler(100, target=fh)
+logger.addHandler(mh)
 
 # Create console handler which shows INFO and above (WARNING, ERRORS, CRITICALS, ...)
 if not silentmode:
     ch = logging.StreamHandler()
     ch.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(message)s')
-    ch.setFormatter(formatter)
+    ch.setFormatter(consoleformatter)
     logger.addHandler(ch)
 
 # Start the program
-logger.info(u"####### Find features #######")
-logger.info(u"Trying to find features on '%s'", inputfile)
+logger.info("####### Find features #######")
+logger.info("Trying to find features on '%s'", inputfile)
 
 # Debug mode?
 if debugmode:
@@ -207,87 +190,91 @@ inputimage = cv2.imread(inputfile, cv2.IMREAD_COLOR)
 
 # Error?
 if inputimage is None:
-    logger.error(u"Input file could not be read")
+    logger.error("Input file could not be read")
     sys.exit(3)
 
 # Shape of image
 imageheight, imagewidth, imagebits = inputimage.shape
 
-logger.info(u"Read input file")
+logger.info("Read input file")
 
 # Use only one channel?
-if singlechannel in ["blue", "green", "red"]:
-    # Split original image into a dictionary
-    imgchannels = {"blue": cv2.split(inputimage)[0],
-                   "green": cv2.split(inputimage)[1],
-                   "red": cv2.split(inputimage)[2]}
-    # Create empty image
-    inputimage = np.zeros((imageheight, imagewidth, 3), np.uint8)
-    # Add channel
-    inputimage[:, :, ["blue", "green", "red"].index(singlechannel)] = imgchannels[singlechannel]
-
-    # Now add just the channel we want
-    logger.info(u"Only %s channel is used for finding features", singlechannel)
+if singlechannel in channelindices:
+    # Index of the channel in the image
+    channelindex = channelindices[singlechannel]
+
+    # Debug output shows just the channel we want
+    if debugmode:
+        inputimage[:, :, [i for i in range(3) if i != channelindex]] = 0
+
+    logger.info("Only %s channel is used for finding features", singlechannel)
 
 # Debug output and presentation
-if debugmode:
-    debugcounter = ffe.debugWriteImage(inputimage, debugcounter)
-    cv2.imshow('Showcase', inputimage)
+showDebugImage(inputimage)
 
 # Create gray image
-grayimage = cv2.cvtColor(inputimage, cv2.COLOR_RGB2GRAY)
+if singlechannel in channelindices:
+    # The gray value of an image with just one channel depends only on this channel; so, instead of converting a whole
+    # image, convert all 256 possible values once and use them as a lookup table for the channel
+    channelramp = np.zeros((1, 256, 3), np.uint8)
+    channelramp[0, :, channelindex] = np.arange(256)
+    graylookup = cv2.cvtColor(channelramp, cv2.COLOR_RGB2GRAY)[0]
+
+    grayimage = graylookup[inputimage[:, :, channelindex]]
+else:
+    grayimage = cv2.cvtColor(inputimage, cv2.COLOR_RGB2GRAY)
 
-logger.info(u"Created gray image")
+# From here on, the color image is only used for drawing the debug output; free it otherwise, so that the contour
+# search does not run with three planes in memory
+if not debugmode:
+    inputimage = None
 
-# Debug output and presentation
-if debugmode:
-    debugcounter = ffe.debugWriteImage(grayimage, debugcounter)
-    cv2.imshow('Showcase', grayimage)
+logger.info("Created gray image")
 
-# Threshhold function
-ret, binaryimage = cv2.threshold(grayimage, threshbinary, 255, cv2.THRESH_BINARY)
+# Debug output and presentation
+showDebugImage(grayimage)
+
+# Threshhold function; the binary image is allocated once and filled by OpenCV. With Otsu's method, the given threshold
+# is ignored and the one separating the two intensity classes of the histogram best is returned instead
+binaryimage = np.empty_like(grayimage)
+if autothreshold:
+    threshbinary, _ = cv2.threshold(grayimage, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU, dst=binaryimage)
+    threshbinary = int(threshbinary)
+else:
+    cv2.threshold(grayimage, threshbinary, 255, cv2.THRESH_BINARY, dst=binaryimage)
 
-logger.info(u"Created binary image using %d as threshold", threshbinary)
+logger.info("Created binary image using %d as threshold", threshbinary)
 
 # Debug output and presentation
-if debugmode:
-    debugcounter = ffe.debugWriteImage(binaryimage, debugcounter)
-    cv2.imshow('Showcase', binaryimage)
+showDebugImage(binaryimage)
 
-# Find contours
-contour_bw_img, contours, hierarchy = cv2.findContours(binaryimage, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+# Find contours; OpenCV 3 returns an additional image in front, which is not needed, and OpenCV 4 returns the contours
+# as tuple (they are refined in place later). The Teh-Chin approximations (CHAIN_APPROX_TC89_*) give about half the
+# points, but shift the refined separation zone boxes by several pixels while hardly saving any time; so all the
+# points of straight segments are kept.
+contours, hierarchy = cv2.findContours(binaryimage, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2:]
+contours = list(contours)
 
-logger.info(u"Searching for contours")
+logger.info("Searching for contours")
 
 # Debug output and presentation
 if debugmode:
     # Make a copy for the contour image
-    cntimage = copy.copy(inputimage)
+    cntimage = inputimage.copy()
     cv2.drawContours(cntimage, contours, -1, (0, 0, 255), 1)
-    debugcounter = ffe.debugWriteImage(cntimage, debugcounter)
-    cv2.imshow('Showcase', cntimage)
+    showDebugImage(cntimage)
 
 # No contours?
 if len(contours) == 0:
-    logger.error(u"Did not find any contours")
+    logger.error("Did not find any contours")
     sys.exit(3)
 
-logger.info(u"Found %d contours", len(contours))
+logger.info("Found %d contours", len(contours))
 
-# Calculate the moments / center-points of the contours
-moments = [0] * len(contours)
-centers = [0, 0] * len(contours)
+# Remove noise contours (single pixels and thin lines without area) before any moments and areas are calculated
+contours, hierarchy = ffe.filterContours(contours, hierarchy, 3)
 
-# Fill arrays
-for i in xrange(len(contours)):
-    moments[i] = cv2.moments(contours[i])
-    if moments[i]['m00'] == 0:
-        centers[i] = (0, 0)
-    else:
-        centers[i] = (int(round(moments[i]['m10'] / moments[i]['m00'], 0)),
-                      int(round(moments[i]['m01'] / moments[i]['m00'], 0)))
-
-logger.info(u"Calculated center-points of contours")
+logger.info("Kept %d contours after removing noise", len(contours))
 
 # Step 3: Find separation zone
 # --------------------------------------------------------------------------------------------------------------------
@@ -295,7 +282,7 @@ logger.info(u"Calculated center-points of contours")
 # the top-level contour takes up most of the space of the picture. At least the following threshold:
 threshpixels = int(thresharea * imagewidth * imageheight)
 
-logger.info(u"Trying to find top-level contour with at least %d pixels in size", threshpixels)
+logger.info("Trying to find top-level contour with at least %d pixels in size", threshpixels)
 
 # Find boundaries
 parentindex, childindex = ffe.findSeparationZoneBoundaries(contours, hierarchy, threshpixels, threshratio,
@@ -303,13 +290,17 @@ parentindex, childindex = ffe.findSeparationZoneBoundaries(contours, hierarchy,
 
 # Nothing found?
 if parentindex == -1 or childindex == -1:
-    logger.error(u"No contour was found, which matches the criteria for the separation zone")
+    logger.error("No contour was found, which matches the criteria for the separation zone")
     sys.exit(4)
 
-logger.info(u"Found a matching contour pair (%d, %d) for the separation zone", parentindex, childindex)
+logger.info("Found a matching contour pair (%d, %d) for the separation zone", parentindex, childindex)
+
+# Center-points are only needed for the contours used further on (by index); the one of the child is calculated before
+# refining the contour
+centers = {childindex: ffe.getCentersOfContours([contours[childindex]])[0]}
 
 # Approximation of contour shape = Refining (Douglas-Peucker algorithm)
-logger.info(u"Refining the contours.")
+logger.info("Refining the contours.")
 
 # Refining
 contours[parentindex] = cv2.approxPolyDP(contours[parentindex],
@@ -319,8 +310,8 @@ contours[childindex] = cv2.approxPolyDP(contours[childindex],
                                         epsilon * cv2.arcLength(contours[childindex], True), True)
 
 # Get boxes for parent and child
-boxparent = np.int0(cv2.boxPoints(cv2.minAreaRect(contours[parentindex])))
-boxchild = np.int0(cv2.boxPoints(cv2.minAreaRect(contours[childindex])))
+boxparent = np.intp(cv2.boxPoints(cv2.minAreaRect(contours[parentindex])))
+boxchild = np.intp(cv2.boxPoints(cv2.minAreaRect(contours[childindex])))
 
 # Debug output and presentation
 if debugmode:
@@ -331,8 +322,7 @@ if debugmode:
     # Draw mid-point
     cv2.circle(inputimage, centers[childindex], 5, (0, 215, 255), -5)
 
-    debugcounter = ffe.debugWriteImage(inputimage, debugcounter)
-    cv2.imshow('Showcase', inputimage)
+    showDebugImage(inputimage)
 
 # Sort the coordinates, so that the order will be top-left, top-right, bottom-left, bottom-right
 boxparent = ffe.sortCoordinates(boxparent, (imagewidth, imageheight))
@@ -349,15 +339,18 @@ flowmarkerindex = (-1, -1)
 
 # Skip?
 if not skip_flowmarkers:
-    logger.info(u"Trying to find the flow markers.")
+    logger.info("Trying to find the flow markers.")
 
     # Find flow markers
     flowmarkerindex = ffe.findFlowMarkers(contours, (parentindex, childindex), boxparent, variance_marker)
 
     if flowmarkerindex[0] == -1 or flowmarkerindex[1] == -1:
-        logger.error(u"Did not find any flowmarker pair.")
+        logger.error("Did not find any flowmarker pair.")
         sys.exit(5)
 
+    # Calculate the center-points of the flow markers
+    centers.update(zip(flowmarkerindex, ffe.getCentersOfContours([contours[i] for i in flowmarkerindex])))
+
     # Debug output and presentation
     if debugmode:
         # Make a copy for the contour image
@@ -365,35 +358,30 @@ if not skip_flowmarkers:
         cv2.circle(inputimage, centers[flowmarkerindex[1]], 5, (0, 255, 0), -5)
         cv2.line(inputimage, centers[flowmarkerindex[0]], centers[flowmarkerindex[1]], (0, 255, 0), 2)
 
-        debugcounter = ffe.debugWriteImage(inputimage, debugcounter)
-        cv2.imshow('Showcase', inputimage)
+        showDebugImage(inputimage)
 
 else:
-    logger.info(u"Did not look for flow markers (--skip-flowmarkers given).")
+    logger.info("Did not look for flow markers (--skip-flowmarkers given).")
 
 # Step 5: Save data in png file
 # --------------------------------------------------------------------------------------------------------------------
 # Here we put our results into a dictionary and write it to the file; we want to make sure that the coordinates are
-# always tuples or list of tuples
-
-# Create a dictionary
-saveinfo = {}
+# always tuples or list of tuples of Python integers (numpy integers cannot be read by every Python and numpy version);
+# tolist() converts all coordinates of a box at once
 
-# Insert outer box of separation zone (parentbox)
-saveinfo.update({"Outer separation zone":
-                     [tuple(boxparent[0]), tuple(boxparent[1]), tuple(boxparent[2]), tuple(boxparent[3])]})
-
-# Insert inner box of separation zone (childbox)
-saveinfo.update({"Inner separation zone":
-                     [tuple(boxchild[0]), tuple(boxchild[1]), tuple(boxchild[2]), tuple(boxchild[3])]})
+# Create a dictionary with the outer box (parentbox) and inner box (childbox) of the separation zone
+saveinfo = {
+    "Outer separation zone": [tuple(point) for point in np.array(boxparent).tolist()],
+    "Inner separation zone": [tuple(point) for point in np.array(boxchild).tolist()],
+}
 
 # Insert flow markers (if not skipped)
 if not skip_flowmarkers:
     # Sort the flow markers from left to right (i.e. by distance to the middle point on the very left of the image)
     flowmarkerlist = ffe.sortCoordinatesByDistanceToPoint(
-        np.array([tuple(centers[flowmarkerindex[0]]), tuple(centers[flowmarkerindex[1]])]), (0, imageheight / 2))
+        np.array([tuple(centers[flowmarkerindex[0]]), tuple(centers[flowmarkerindex[1]])]), (0, imageheight // 2))
     # Save
-    saveinfo.update({"Flowmarkers": [tuple(flowmarkerlist[0]), tuple(flowmarkerlist[1])]})
+    saveinfo["Flowmarkers"] = [tuple(point) for point in flowmarkerlist.tolist()]
 
 # Write to file
 ffe.updateDictionaryOfPng(inputfile, saveinfo)
@@ -402,13 +390,12 @@ logger.info("Saved coordinates in file.")
 
 # Last step: cleaning up
 # --------------------------------------------------------------------------------------------------------------------
-# Debugmode: wait for user input
+# Debugmode: wait for user input and destroy all windows; windows are only opened in debug mode, so a batch run does
+# not need to touch the GUI backend at all
 if debugmode:
     cv2.waitKey(0)
-
-# Destroy all windows
-cv2.destroyAllWindows()
+    cv2.destroyAllWindows()
 
 # Final logging
-logger.info(u"Finding features ended on '%s'", inputfile)
-logger.info(u"####### Find features end #######")
+logger.info("Finding features ended on '%s'", inputfile)
+logger.info("####### Find features end #######")
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -17,74 +17,106 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-# Import modules
-import cv2              # OpenCV
-import numpy as np      # Numpy - You always need this.
-import ffe              # frequently-used function script
+# Import modules (OpenCV, Numpy, and ffe are imported after parsing the command-line, so that showing the help page
+# does not have to wait for them)
 import sys              # Sys functions
 import logging          # Logging functions
 import getopt           # Get and parse command-line arguments
+import multiprocessing  # Searching several channels at once
+
+# Indices of the channels in a (BGR) image
+channelindices = {"blue": 0, "green": 1, "red": 2}
+
+
+# Help page (written at once by `printHelpPage`)
+helptext = ("USAGE: script.py [options] --input-file <file>\n"
+            "\n"
+            "Order of options is not important. The input file is mandatory.\n"
+            "\n"
+            "Switches:\n"
+            "\t--help:\t\t\t\t\t\tShows this help page.\n"
+            "\t--debug:\t\t\t\t\tActivate debug mode output of intermediate pictures as debugNNN.png and preview.\n"
+            "\t--silent:\t\t\t\t\tDo not show anything in the console (except parameter errors).\n"
+            "\n"
+            "General options:\n"
+            "\t--input-file <file>\t\t\tInput file. <file> should be a PNG-file.\n"
+            "\t--channel <channel>\t\t\tUses only <channel> for feature finding. Default: All channels are used. "
+            "<channel> can be blue, green, or red.\n"
+            "\t--zone-border <width>\t\tWidth of border, which will be blackened. Default: 20\n"
+            "\t--threshbin <tresh>\t\t\tBias for binary picture. Range: 0-255. Default: 45.\n"
+            "\t--noendpoints\t\t\tRemove endpoints from trajectories\n"
+            "\t--useinlet #\t\t\tUses only inlet # (zero based!) as start point (if present). Default: Uses every "
+            "inlet.\n"
+            "\t--minpoints #\t\t\tMinimum points a trajectory must have. Default: 0.\n"
+            "\n"
+            "Options for comparing trajectories:\n"
+            "\t--maxoverlap <overlap>\t\tMaximum overlap two trajectories can have before they are considered "
+            "identical. Range: 0.00-1.00. Default: 0.75.\n"
+            "\t--useHausdorff\t\t\t\tUses Hausdorff-distance instead of area overlap to compare trajectories. "
+            "Default: False.\n"
+            "\t--hausdorffbias <bias>\t\tIf distance is less or equal this bias, two trajectories are considered "
+            "identical. Should be a float. Default: 10.0.\n"
+            "\n"
+            "Options for finding endpoints:\n"
+            "\t--threshpen <pen>\t\t\tThe actual region (in percent, from right border) in which to look for the "
+            "endpoints of the trajectories. Range: 0.00-1.00. Default: 0.70.\n"
+            "\t--ordermin <order>\t\t\tNumber of points (relative to width of image) used to compare for finding "
+            "minima. Range: 0.00-1.00. Default: 0.05.\n"
+            "\n"
+            "Options for finding trajectories (gradient):\n"
+            "\t--maxiteration <number>\t\tMaximum iterations. Should be a positive integer. Default: 1000.\n"
+            "\t--gradient <factor>\t\t\tScaling factor for the gradient/focus field relative to max(width, height) of "
+            "image. Range: 0.00-1.00. Default: 0.10.\n"
+            "\t--densityrad <radius>\t\tRadius of density field to calculate, 1 = 3x3 field, 2 = 5x5 field, etc. Has "
+            "to be positive integer. Default: 1.\n"
+            "\t--maxattraction <a>\t\t\tAttraction of the inlets - the slope of the gradient will be influenced by "
+            "this. Should be positive float. Default: 1.00.\n"
+            "\n"
+            "Options for finding trajectories (Dijkstra):\n"
+            "\t--useDijkstra\t\t\t\tUses path finding (Dijkstra) for trajectory finding\n"
+            "\t--densityrad <radius>\t\tRadius of density field to calculate, 1 = 3x3 field, 2 = 5x5 field, etc. Has "
+            "to be positive integer. Default: 1.\n"
+            "\t--dijkstrabias <bias>\t\tBias for the density image. Should be an integer. Default: 50.\n"
+            "\t--everyotherpoint <points>\tOnly save every <points>. point. Otherwise a point for each pixel between "
+            "start and end will be generated. Should be positive integer. Default: 10.\n")
 
 
 # Function: Prints help page
 # --------------------------------------------------------------------------------------------------------------------
 def printHelpPage():
-    print("USAGE: script.py [options] --input-file <file>")
-    print("")
-
-    print("Order of options is not important. The input file is mandatory.")
-    print("")
-
-    print("Switches:")
-    print("\t--help:\t\t\t\t\t\tShows this help page.")
-    print("\t--debug:\t\t\t\t\tActivate debug mode output of intermediate pictures as debugNNN.png and preview.")
-    print("\t--silent:\t\t\t\t\tDo not show anything in the console (except parameter errors).")
-    print("")
-
-    print("General options:")
-    print("\t--input-file <file>\t\t\tInput file. <file> should be a PNG-file.")
-    print("\t--channel <channel>\t\t\tUses only <channel> for feature finding. Default: All channels are used. "
-          "<channel> can be blue, green, or red.")
-    print("\t--zone-border <width>\t\tWidth of border, which will be blackened. Default: 20")
-    print("\t--threshbin <tresh>\t\t\tBias for binary picture. Range: 0-255. Default: 45.")
-    print("\t--noendpoints\t\t\tRemove endpoints from trajectories")
-    print("\t--useinlet #\t\t\tUses only inlet # (zero based!) as start point (if present). Default: Uses every inlet.")
-    print("\t--minpoints #\t\t\tMinimum points a trajectory must have. Default: 0.")
-    print("")
-
-    print("Options for comparing trajectories:")
-    print("\t--maxoverlap <overlap>\t\tMaximum overlap two trajectories can have before they are considered "
-          "identical. Range: 0.00-1.00. Default: 0.75.")
-    print("\t--useHausdorff\t\t\t\tUses Hausdorff-distance instead of area overlap to compare trajectories. "
-          "Default: False.")
-    print("\t--hausdorffbias <bias>\t\tIf distance is less or equal this bias, two trajectories are considered "
-          "identical. Should be a float. Default: 10.0.")
-    print("")
-
-    print("Options for finding endpoints:")
-    print("\t--threshpen <pen>\t\t\tThe actual region (in percent, from right border) in which to look for the "
-          "endpoints of the trajectories. Range: 0.00-1.00. Default: 0.70.")
-    print("\t--ordermin <order>\t\t\tNumber of points (relative to width of image) used to compare for finding minima. "
-          "Range: 0.00-1.00. Default: 0.05.")
-    print("")
-
-    print("Options for finding trajectories (gradient):")
-    print("\t--maxiteration <number>\t\tMaximum iterations. Should be a positive integer. Default: 1000.")
-    print("\t--gradient <factor>\t\t\tScaling factor for the gradient/focus field relative to max(width, height) "
-          "of image. Range: 0.00-1.00. Default: 0.10.")
-    print("\t--densityrad <radius>\t\tRadius of density field to calculate, 1 = 3x3 field, 2 = 5x5 field, etc. "
-          "Has to be positive integer. Default: 1.")
-    print("\t--maxattraction <a>\t\t\tAttraction of the inlets - the slope of the gradient will be "
-          "influenced by this. Should be positive float. Default: 1.00.")
-    print("")
-
-    print("Options for finding trajectories (Dijkstra):")
-    print("\t--useDijkstra\t\t\t\tUses path finding (Dijkstra) for trajectory finding")
-    print("\t--densityrad <radius>\t\tRadius of density field to calculate, 1 = 3x3 field, 2 = 5x5 field, etc. "
-          "Has to be positive integer. Default: 1.")
-    print("\t--dijkstrabias <bias>\t\tBias for the density image. Should be an integer. Default: 50.")
-    print("\t--everyotherpoint <points>\tOnly save every <points>. point. Otherwise a point for each pixel between "
-          "start and end will be generated. Should be positive integer. Default: 10.")
+    sys.stdout.write(helptext)
+
+
+# Function: Searches the trajectories in a (thresholded) channel image. Returns the trajectories (with widths) or
+#           None if no endpoints were found. The parameters are the global ones from the command-line.
+# --------------------------------------------------------------------------------------------------------------------
+def findTrajectoriesOfChannel(channelimage):
+    # Try to determine endpoints for channel with this blur image
+    endpoints = ffe.findEndpointsOfTrajectories(channelimage, threshpenetration, ordermin)
+
+    # No endpoints found?
+    if len(endpoints) == 0:
+        return None
+
+    # The density image is the same for every search on this channel, so calculate it only once
+    densityimage = ffe.getDensityImage(channelimage, densityrad)
+
+    # Get the trajectories from this channel using ...
+    if useDijkstra:
+        # ... Dijkstra pathfinding
+        trajectories = ffe.getTrajectoriesFromImageDijkstra(channelimage, startpoints, endpoints, dijkstrabias,
+                                                            everyotherpoint, densityrad, densityimage=densityimage)
+    else:
+        # ... gradient method
+        trajectories = ffe.getTrajectoriesFromImage(channelimage, startpoints, endpoints,
+                                                    flowdirection, maxiteration, gradientfactor,
+                                                    densityrad, maxattraction)
+
+    # Get the width of every point in the trajectories
+    for index, trajectory in enumerate(trajectories):
+        trajectories[index] = ffe.findWidthOfTrajectory(channelimage, trajectory, densityrad, densityimage)
+
+    return trajectories
 
 
 # Step 0: Parse command-line arguments
@@ -152,96 +184,86 @@ except getopt.GetoptError as parametererror:
     printHelpPage()
     sys.exit(2)
 
+# Switches and the parameter they enable
+switches = {"--debug": "debugmode", "--silent": "silentmode", "--noendpoints": "noendpoints",
+            "--useHausdorff": "useHausdorff", "--useDijkstra": "useDijkstra"}
+
+# Numeric options: the parameter they set, the type of the value, a check of the value, and the message shown if the
+# check fails (the parameter keeps its default value then)
+numericoptions = {
+    "--threshbin": ("threshbinary", int, lambda value: 0 <= value <= 255,
+                    "Threshold should be an integer in the range of 0-255. '%s' was given."),
+    "--useinlet": ("useinlet", int, lambda value: 0 <= value,
+                   "Useinlet should be a positive integer. '%s' was given."),
+    "--minpoints": ("minpoints", int, lambda value: 0 <= value,
+                    "Minpoints should be a positive integer. '%s' was given."),
+    "--maxoverlap": ("maxoverlap", float, lambda value: 0.0 <= value <= 1.0,
+                     "Maxoverlap should be a float in the range of 0.00-1.00. '%s' was given."),
+    "--hausdorffbias": ("hausdorffbias", float, lambda value: 0.0 < value,
+                        "Hausdorffbias should be a positive float. '%s' was given."),
+    "--threshpen": ("threshpenetration", float, lambda value: 0.0 <= value <= 1.0,
+                    "Threshpen should be a float in the range of 0.00-1.00. '%s' was given."),
+    "--ordermin": ("ordermin", float, lambda value: 0.0 <= value <= 1.0,
+                   "Ordermin should be a float in the range of 0.00-1.00. '%s' was given."),
+    "--gradient": ("gradientfactor", float, lambda value: 0.0 <= value <= 1.0,
+                   "Gradient should be a float in the range of 0.00-1.00. '%s' was given."),
+    "--maxattraction": ("maxattraction", float, lambda value: 0.0 < value,
+                        "Maxattraction should be a positive float. '%s' was given."),
+    "--maxiteration": ("maxiteration", int, lambda value: 0 < value,
+                       "Maxiteration should be a positive integer. '%s' was given."),
+    "--dijkstrabias": ("dijkstrabias", int, lambda value: 0 < value,
+                       "Dijkstrabias should be an integer. '%s' was given."),
+    "--everyotherpoint": ("everyotherpoint", int, lambda value: 0 < value,
+                          "Everyotherpoint should be a positive integer. '%s' was given."),
+    "--densityrad": ("densityrad", int, lambda value: 0 < value,
+                     "Densityrad should be a positive integer. '%s' was given.")}
+
+# Values of the given switches and numeric options by parameter name (assigned to the parameters below)
+options = {}
+
 # Otherwise, collect the user input
 for opt, arg in opts:
     if opt == '--help':
         printHelpPage()
         sys.exit(0)
+    elif opt in switches:
+        options[switches[opt]] = True
+    elif opt in numericoptions:
+        parameter, valuetype, isvalid, message = numericoptions[opt]
+        if isvalid(valuetype(arg)):
+            options[parameter] = valuetype(arg)
+        else:
+            print(message % str(arg))
     elif opt == "--input-file":
         inputfile = arg
-    elif opt == "--debug":
-        debugmode = True
-    elif opt == "--silent":
-        silentmode = True
     elif opt == "--channel":
-        if arg in ["blue", "green", "red"]:
+        if arg in channelindices:
             singlechannel = arg
         else:
             print("Channel has to be one of: blue, green, or red. '%s' was given." % str(arg))
             sys.exit(0)
     elif opt == "--zone-border":
         zoneborder = abs(int(arg))
-    elif opt == "--threshbin":
-        if 0 <= int(arg) <= 255:
-            threshbinary = int(arg)
-        else:
-            print("Threshold should be an integer in the range of 0-255. '%s' was given." % str(arg))
-    elif opt == "--useinlet":
-        if 0 <= int(arg):
-            useinlet = int(arg)
-        else:
-            print("Useinlet should be a positive integer. '%s' was given." % str(arg))
-    elif opt == "--minpoints":
-        if 0 <= int(arg):
-            minpoints = int(arg)
-        else:
-            print("Minpoints should be a positive integer. '%s' was given." % str(arg))
-    elif opt == "--maxoverlap":
-        if 0.0 <= float(arg) <= 1.0:
-            maxoverlap = float(arg)
-        else:
-            print("Maxoverlap should be a float in the range of 0.00-1.00. '%s' was given." % str(arg))
-    elif opt == "--useHausdorff":
-        useHausdorff = True
-    elif opt == "--hausdorffbias":
-        if 0.0 < float(arg):
-            hausdorffbias = float(arg)
-        else:
-            print("Hausdorffbias should be a positive float. '%s' was given." % str(arg))
-    elif opt == "--threshpen":
-        if 0.0 <= float(arg) <= 1.0:
-            threshpenetration = float(arg)
-        else:
-            print("Threshpen should be a float in the range of 0.00-1.00. '%s' was given." % str(arg))
-    elif opt == "--ordermin":
-        if 0.0 <= float(arg) <= 1.0:
-            ordermin = float(arg)
-        else:
-            print("Ordermin should be a float in the range of 0.00-1.00. '%s' was given." % str(arg))
-    elif opt == "--gradient":
-        if 0.0 <= float(arg) <= 1.0:
-            gradientfactor = float(arg)
-        else:
-            print("Gradient should be a float in the range of 0.00-1.00. '%s' was given." % str(arg))
-    elif opt == "--maxattraction":
-        if 0.0 < float(arg):
-            maxattraction = float(arg)
-        else:
-            print("Maxattraction should be a positive float. '%s' was given." % str(arg))
-    elif opt == "--maxiteration":
-        if 0 < int(arg):
-            maxiteration = int(arg)
-        else:
-            print("Maxiteration should be a positive integer. '%s' was given." % str(arg))
-    elif opt == "--dijkstrabias":
-        if 0 < int(arg):
-            dijkstrabias = int(arg)
-        else:
-            print("Dijkstrabias should be an integer. '%s' was given." % str(arg))
-    elif opt == "--everyotherpoint":
-        if 0 < int(arg):
-            everyotherpoint = int(arg)
-        else:
-            print("Everyotherpoint should be a positive integer. '%s' was given." % str(arg))
-    elif opt == "--densityrad":
-        if 0 < int(arg):
-            densityrad = int(arg)
-        else:
-            print("Densityrad should be a positive integer. '%s' was given." % str(arg))
-    elif opt == "--useDijkstra":
-        useDijkstra = True
-    elif opt == "--noendpoints":
-        noendpoints = True
+
+# Set the parameters from the collected values (parameters, which were not given, keep their default values)
+debugmode = options.get("debugmode", debugmode)
+silentmode = options.get("silentmode", silentmode)
+noendpoints = options.get("noendpoints", noendpoints)
+useHausdorff = options.get("useHausdorff", useHausdorff)
+useDijkstra = options.get("useDijkstra", useDijkstra)
+threshbinary = options.get("threshbinary", threshbinary)
+useinlet = options.get("useinlet", useinlet)
+minpoints = options.get("minpoints", minpoints)
+maxoverlap = options.get("maxoverlap", maxoverlap)
+hausdorffbias = options.get("hausdorffbias", hausdorffbias)
+threshpenetration = options.get("threshpenetration", threshpenetration)
+ordermin = options.get("ordermin", ordermin)
+gradientfactor = options.get("gradientfactor", gradientfactor)
+maxattraction = options.get("maxattraction", maxattraction)
+maxiteration = options.get("maxiteration", maxiteration)
+dijkstrabias = options.get("dijkstrabias", dijkstrabias)
+everyotherpoint = options.get("everyotherpoint", everyotherpoint)
+densityrad = options.get("densityrad", densityrad)
 
 # No input file given?
 if len(inputfile) == 0:
@@ -249,6 +271,11 @@ if len(inputfile) == 0:
     printHelpPage()
     sys.exit(1)
 
+# Import the modules needed for the evaluation
+import cv2              # OpenCV
+import numpy as np      # Numpy - You always need this.
+import ffe              # frequently-used function script
+
 # Step 1: Setup logging
 # --------------------------------------------------------------------------------------------------------------------
 # Create logger object for this script
@@ -273,8 +300,8 @@ if not silentmode:
     logger.addHandler(ch)
 
 # Start the program
-logger.info(u"####### Find trajectories #######")
-logger.info(u"Trying to find trajectories on '%s'", inputfile)
+logger.info("####### Find trajectories #######")
+logger.info("Trying to find trajectories on '%s'", inputfile)
 
 # Debug mode?
 if debugmode:
@@ -282,42 +309,34 @@ if debugmode:
 
 # Step 2: Read input image and data
 # --------------------------------------------------------------------------------------------------------------------
-# Read source image
-inputimage = cv2.imread(inputfile, cv2.IMREAD_COLOR)
+# Read source image and FFE data (file is read only once)
+inputimage, ffedata = ffe.loadImageAndDictionaryFromPng(inputfile, cv2.IMREAD_COLOR)
 
 # Error?
 if inputimage is None:
-    logger.error(u"Input file could not be read")
+    logger.error("Input file could not be read")
     sys.exit(3)
 
 # Shape of image
 imageheight, imagewidth, imagebits = inputimage.shape
 
-logger.info(u"Read input file")
+logger.info("Read input file")
 
-# Use only one channel?
-if singlechannel in ["blue", "green", "red"]:
-    # Split original image into a dictionary
-    imgchannels = {"blue": cv2.split(inputimage)[0],
-                   "green": cv2.split(inputimage)[1],
-                   "red": cv2.split(inputimage)[2]}
-    # Create empty image
-    inputimage = np.zeros((imageheight, imagewidth, 3), np.uint8)
-    # Add channel
-    inputimage[:, :, ["blue", "green", "red"].index(singlechannel)] = imgchannels[singlechannel]
+# Use only one channel? The other channels are skipped when searching for trajectories (see step 6)
+if singlechannel in channelindices:
+    # Debug output shows just the channel we want
+    if debugmode:
+        channelindex = channelindices[singlechannel]
+        inputimage[:, :, [i for i in range(3) if i != channelindex]] = 0
 
-    # Now add just the channel we want
-    logger.info(u"Only %s channel is used for finding trajectories", singlechannel)
+    logger.info("Only %s channel is used for finding trajectories", singlechannel)
 
 # Debug output and presentation
 if debugmode:
     debugcounter = ffe.debugWriteImage(inputimage, debugcounter)
     cv2.imshow('Showcase', inputimage)
 
-# Read FFE data
-ffedata = ffe.loadDictionaryFromPng(inputfile)
-
-logger.info(u"Extracting separation zone from image")
+logger.info("Extracting separation zone from image")
 
 # Extracts the separation zone from the image
 zoneimage, transmatrix = ffe.extractZoneFromImage(inputimage, ffedata["Inner separation zone"], zoneborder)
@@ -325,7 +344,7 @@ zoneimage, transmatrix = ffe.extractZoneFromImage(inputimage, ffedata["Inner sep
 # Shape of zone image
 zoneheight, zonewidth, zonebits = zoneimage.shape
 
-logger.info(u"Extracted zone (%dx%d) from image (%dx%d)", zonewidth, zoneheight, imagewidth, imageheight)
+logger.info("Extracted zone (%dx%d) from image (%dx%d)", zonewidth, zoneheight, imagewidth, imageheight)
 
 # Debug output and presentation
 if debugmode:
@@ -342,7 +361,7 @@ if "Flowmarkers" in ffedata:
     # Transform flow markers
     flowdirection = ffe.getInverseFlowDirection(ffedata["Flowmarkers"], transmatrix)
 
-logger.info(u"Flow direction is (%.2f, %.2f)", flowdirection[0], flowdirection[1])
+logger.info("Flow direction is (%.2f, %.2f)", flowdirection[0], flowdirection[1])
 
 # Step 4: Calculate resolution
 # --------------------------------------------------------------------------------------------------------------------
@@ -354,7 +373,7 @@ if "Physical zone dimensions" in ffedata:
     resolution = (float(ffedata["Physical zone dimensions"][0]) / float(zonewidth),
                   float(ffedata["Physical zone dimensions"][1]) / float(zoneheight))
 
-logger.info(u"Resolution of image is %.2f x %.2f mm² per pixel²", resolution[0], resolution[1])
+logger.info("Resolution of image is %.2f x %.2f mm² per pixel²", resolution[0], resolution[1])
 
 # Step 5: Get start points from inlets (if given) or construct one from flow markers/left border of zone
 # --------------------------------------------------------------------------------------------------------------------
@@ -362,18 +381,19 @@ startpoints = []
 
 # Inlet point(s) given?
 if "Inlets" in ffedata:
-    # We do not need the physical but the pixel represenation
-    for inlet in ffedata["Inlets"]:
-        startpoints.append((int(inlet[0] / resolution[0]),
-                            int(inlet[1] / resolution[1]),
-                            max(int(inlet[2] / ((resolution[1]+resolution[0])/2.0)), 1)))
+    # We do not need the physical but the pixel represenation; the diameter is converted with the mean resolution
+    # and is at least one pixel
+    inlets = np.array(ffedata["Inlets"], dtype=np.float64).reshape(-1, 3)
+    inlets = (inlets / (resolution[0], resolution[1], (resolution[1]+resolution[0])/2.0)).astype(int)
+    inlets[:, 2] = np.maximum(inlets[:, 2], 1)
+    startpoints = [tuple(inlet) for inlet in inlets.tolist()]
 
     # Useinlet given and in the range of given inlets? Well, then only use this one start point
     if 0 <= useinlet < len(startpoints):
-        logger.info(u"Only use inlet %d for evaluation.", useinlet)
+        logger.info("Only use inlet %d for evaluation.", useinlet)
         startpoints = [startpoints[useinlet]]
 
-    logger.info(u"%d inlet(s) in data. Will be used as starting points.", len(startpoints))
+    logger.info("%d inlet(s) in data. Will be used as starting points.", len(startpoints))
 
 # No starting points?
 if len(startpoints) == 0:
@@ -388,18 +408,28 @@ if len(startpoints) == 0:
 
 # Step 6: Find trajectories for given channel
 # --------------------------------------------------------------------------------------------------------------------
-# Get channels
-imgchannels = {"blue": cv2.split(zoneimage)[0],
-               "green": cv2.split(zoneimage)[1],
-               "red": cv2.split(zoneimage)[2]}
+# Use only one channel? Then extract just this one; the others are not searched at all
+if singlechannel in channelindices:
+    imgchannels = {singlechannel: cv2.extractChannel(zoneimage, channelindices[singlechannel])}
 
-# Final list of trajectories
-finaltrajectories = []
+    # Remove pixels under the threshhold; only in this channel
+    ret, thresholdimage = cv2.threshold(imgchannels[singlechannel], threshbinary, 255, cv2.THRESH_TOZERO)
+else:
+    # Get channels; split the image only once
+    blue, green, red = cv2.split(zoneimage)
+    imgchannels = {"blue": blue, "green": green, "red": red}
+
+    # Remove pixels under the threshhold; all channels at once
+    ret, thresholdimage = cv2.threshold(zoneimage, threshbinary, 255, cv2.THRESH_TOZERO)
+
+# Channels to search and their images
+searchchannels = []
+channelimages = []
 
 # For each channel
 for channel in imgchannels:
     # If channel is empty, then skip
-    if imgchannels[channel].max() == 0:
+    if cv2.countNonZero(imgchannels[channel]) == 0:
         continue
 
     # Debug output and presentation
@@ -407,37 +437,46 @@ for channel in imgchannels:
         debugcounter = ffe.debugWriteImage(imgchannels[channel], debugcounter)
         cv2.imshow(channel, imgchannels[channel])
 
-    logger.info(u"Search %s channel for trajectories", channel)
+    logger.info("Search %s channel for trajectories", channel)
 
-    # First, remove pixels under the threshhold
-    ret, channelimage = cv2.threshold(imgchannels[channel], threshbinary, 255, cv2.THRESH_TOZERO)
+    # Take the channel from the thresholded image (a single channel is already thresholded on its own)
+    if singlechannel in channelindices:
+        channelimage = thresholdimage
+    else:
+        channelimage = cv2.extractChannel(thresholdimage, channelindices[channel])
+
+    searchchannels.append(channel)
+    channelimages.append(channelimage)
+
+# The channels are independent of each other; so, search them in parallel (one process each) if there are several
+# and more than one CPU. The worker processes are always forked, whatever the default start method of the platform is
+# (they know all parameters then and do not run this script again); where forking is not available (e.g. Windows), the
+# channels are searched one after another. In debug mode, the channels are searched one after another as well because
+# of the preview windows.
+processes = min(len(channelimages), multiprocessing.cpu_count())
+
+if processes > 1 and "fork" in multiprocessing.get_all_start_methods() and not debugmode:
+    pool = multiprocessing.get_context("fork").Pool(processes)
+    channeltrajectories = pool.map(findTrajectoriesOfChannel, channelimages)
+    pool.close()
+    pool.join()
+else:
+    channeltrajectories = [findTrajectoriesOfChannel(channelimage) for channelimage in channelimages]
 
-    # Try to determine endpoints for channel with this blur image
-    endpoints = ffe.findEndpointsOfTrajectories(channelimage, threshpenetration, ordermin)
+# Final list of trajectories
+finaltrajectories = []
 
+# Collect the trajectories of each channel (in the order of the channels above)
+for channel, trajectories in zip(searchchannels, channeltrajectories):
     # No endpoints found?
-    if len(endpoints) == 0:
-        logger.warning(u"Could not find any endpoints for this channel. However, the channel itself is not empty.")
+    if trajectories is None:
+        logger.warning("Could not find any endpoints in %s channel. However, the channel itself is not empty.",
+                       channel)
         continue
 
-    # Get the trajectories from this channel using ...
-    if useDijkstra:
-        # ... Dijkstra pathfinding
-        trajectories = ffe.getTrajectoriesFromImageDijkstra(channelimage, startpoints, endpoints, dijkstrabias,
-                                                            everyotherpoint, densityrad)
-    else:
-        # ... gradient method
-        trajectories = ffe.getTrajectoriesFromImage(channelimage, startpoints, endpoints,
-                                                    flowdirection, maxiteration, gradientfactor,
-                                                    densityrad, maxattraction)
-
-    # Get the width of every point in the trajectories
-    for index, trajectory in enumerate(trajectories):
-        trajectories[index] = ffe.findWidthOfTrajectory(channelimage, trajectory, densityrad)
-
     # No trajectories found?
     if len(trajectories) == 0:
-        logger.warning(u"Could not find any trajectories for this channel. However, found endpoints.")
+        logger.warning("Could not find any trajectories in %s channel. However, found endpoints.", channel)
         continue
 
     # Combine this trajectories with the trajectories already found (i.e. test for duplicates)
@@ -445,17 +484,17 @@ for channel in imgchannels:
                                                 useHausdorff, hausdorffbias)
 
 
-logger.info(u"%d trajectories were found in file.", len(finaltrajectories))
+logger.info("%d trajectories were found in file.", len(finaltrajectories))
 
 # Remove endpoints?
 if noendpoints:
-    logger.info(u"Remove endpoints (--noendpoints given).")
-    for i in xrange(len(finaltrajectories)):
-        del finaltrajectories[i][-1]
+    logger.info("Remove endpoints (--noendpoints given).")
+    # Slicing instead of deleting the last point; does not fail for empty trajectories
+    finaltrajectories = [trajectory[:-1] for trajectory in finaltrajectories]
 
 # Filter all trajectories, which are less then minpoints
 if minpoints > 0:
-    logger.info(u"Remove all trajectories with less than %d points.", minpoints)
+    logger.info("Remove all trajectories with less than %d points.", minpoints)
 
     # Create new list
     filteredtrajectories = []
@@ -466,7 +505,7 @@ if minpoints > 0:
             filteredtrajectories.append(trajectory)
 
     # Log
-    logger.info(u"%d of %d trajectories were removed. %d remain.", len(finaltrajectories)-len(filteredtrajectories),
+    logger.info("%d of %d trajectories were removed. %d remain.", len(finaltrajectories)-len(filteredtrajectories),
                 len(finaltrajectories), len(filteredtrajectories))
 
     # Overwrite
@@ -476,23 +515,22 @@ if minpoints > 0:
 
 # Debug output and presentation
 if debugmode:
-    # Create black and white copy
-    zoneimagebw = cv2.cvtColor(zoneimage, cv2.COLOR_BGR2GRAY)
-    zoneimagebw = cv2.cvtColor(zoneimagebw, cv2.COLOR_GRAY2BGR)
-
-    # Delete blue and red channel
-    zoneimagebw[:, :, 0] = 0
-    zoneimagebw[:, :, 2] = 0
+    # Create a black copy and put the black and white image with reduced intensity into the green channel
+    zoneimagebw = np.zeros_like(zoneimage)
+    zoneimagebw[:, :, 1] = cv2.subtract(cv2.cvtColor(zoneimage, cv2.COLOR_BGR2GRAY), 100)
 
-    # Reduce intensity of green channel
-    zoneimagebw[:, :, 1] = cv2.subtract(zoneimagebw[:, :, 1], 100)
-
-    # Draw trajectories on the image
+    # Draw trajectories on the image; the whole line at once and an arrow on the last segment for the direction
     for line in finaltrajectories:
-        for l in xrange(len(line) - 1):
-            cv2.circle(zoneimagebw, (int(line[l][0]), int(line[l][1])), 2, (0, 215, 255), -5)
-            cv2.arrowedLine(zoneimagebw, (int(line[l][0]), int(line[l][1])),
-                            (int(line[l+1][0]), int(line[l+1][1])), (0, 215, 255), 2)
+        # Skip empty trajectories
+        if len(line) == 0:
+            continue
+
+        points = np.array([(int(point[0]), int(point[1])) for point in line], dtype=np.int32)
+        cv2.polylines(zoneimagebw, [points.reshape(-1, 1, 2)], False, (0, 215, 255), 2)
+        for point in points[:-1].tolist():
+            cv2.circle(zoneimagebw, tuple(point), 2, (0, 215, 255), -5)
+        if len(points) > 1:
+            cv2.arrowedLine(zoneimagebw, tuple(points[-2].tolist()), tuple(points[-1].tolist()), (0, 215, 255), 2)
 
     # Draw inlets
     for pt in startpoints:
@@ -528,5 +566,5 @@ if debugmode:
 cv2.destroyAllWindows()
 
 # Final logging
-logger.info(u"Finding trajectories ended on '%s'", inputfile)
-logger.info(u"####### Find trajectories end #######")
+logger.info("Finding trajectories ended on '%s'", inputfile)
+logger.info("####### Find trajectories end #######")
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -29,6 +29,7 @@ import ffe              # frequently-used function script
 import sys              # Sys functions
 import logging          # Logging functions
 import png              # Raw PNG read/write functions
+import re               # Regular expressions
 import getopt           # Get and parse command-line arguments
 
 
@@ -69,9 +70,9 @@ def printHelpPage():
 inputfile = ""
 outputfile = ""
 
-# This is the list of keys, which are recorded during acquisition
-acquisitionkeys = ["Experiment name", "Dataline 1", "Dataline 2", "Channels recorded", "Timestamp",
-                   "Snapshot time", "Image counter"]
+# This is the set of keys, which are recorded during acquisition
+acquisitionkeys = frozenset(["Experiment name", "Dataline 1", "Dataline 2", "Channels recorded", "Timestamp",
+                             "Snapshot time", "Image counter"])
 
 # Command, default: show content of dictionary
 command = "show"
@@ -152,16 +153,21 @@ if command in ["show", "chunks"]:
     logger.setLevel(logging.CRITICAL+1)
 
 # Start the program
-logger.info(u"####### Manipulating PNG data #######")
+logger.info("####### Manipulating PNG data #######")
 
 
 # Step 1: Open file and read dfFe content as dictionary
 # --------------------------------------------------------------------------------------------------------------------
-logger.info(u"Open and read file '%s'", inputfile)
+logger.info("Open and read file '%s'", inputfile)
 
 # Read data
 ffedata = ffe.loadDictionaryFromPng(inputfile)
 
+# Error?
+if ffedata is None:
+    logger.error("Input file could not be read.")
+    sys.exit(3)
+
 
 # Step 2: Execute commands
 # --------------------------------------------------------------------------------------------------------------------
@@ -173,17 +179,20 @@ if command == "show":
         print("There is no dfFe chunk in the file.")
     # Else, show content of dfFe in table
     else:
+        # Format of a table row
+        rowformat = "{:<30} {:<30}".format
+
         print("")
-        print("{:<30} {:<30}".format('Key', 'Data'))
+        print(rowformat('Key', 'Data'))
         print("-"*80)
-        # Print the sorted data
-        for key, data in sorted(ffedata.iteritems()):
+        # Print the data sorted by key (only the keys are sorted, the data is never compared)
+        for key in sorted(ffedata):
             # String
-            data = str(data)
+            data = str(ffedata[key])
             # Shorten the data if necessary
             dataline = (data[:45] + ' (..)') if len(data) > 50 else data
             # Print
-            print("{:<30} {:<30}".format(key, dataline))
+            print(rowformat(key, dataline))
         print("")
 
     # End of operation
@@ -194,19 +203,19 @@ elif command == "chunks":
     # Open the file
     pngfile = png.Reader(inputfile)
 
-    # Get list of chunks in file
-    chunklist = list(pngfile.chunks())
-
-    # Print chunk data
+    # Print chunk data; go through the chunks one by one instead of keeping all of them (including the image data) in
+    # memory
+    rowformat = "{:<6} {:<8} {:<50}".format
     print("")
-    print("{:<6} {:<8} {:<50}".format('Chunk', 'Length', 'Data'))
+    print(rowformat('Chunk', 'Length', 'Data'))
     print("-" * 80)
-    for data in chunklist:
+    for data in pngfile.chunks():
         # Shorten the string
-        dataline = (data[1][:45] + ' (..)') if len(data[1]) > 50 else data[1]
+        dataline = (data[1][:45] + b' (..)') if len(data[1]) > 50 else data[1]
         # Remove newline characters
-        dataline = dataline.translate(None, "\r\n")
-        print("{:<6} {:<8} {:<50}".format(data[0], len(data[1]), dataline))
+        dataline = dataline.translate(None, b"\r\n")
+        # Chunk type and data are bytes; show them as text (every byte maps to one character)
+        print(rowformat(data[0].decode("latin-1"), len(data[1]), dataline.decode("latin-1")))
 
     print("")
 
@@ -214,24 +223,24 @@ elif command == "chunks":
 elif command == "copy":
     # No output file given?
     if len(outputfile) == 0:
-        logger.error(u"No outpfile specified for copy command.")
+        logger.error("No outpfile specified for copy command.")
         sys.exit(1)
 
     # Logging
-    logger.info(u"Copy data from '%s' to '%s'.", inputfile, outputfile)
+    logger.info("Copy data from '%s' to '%s'.", inputfile, outputfile)
 
     # Copy dictionary
     outputdata = {}
 
     # If not suppressed we want to overwrite only some data
     if not copyall:
-        logger.info(u"Will not overwrite data recorded during acquisition.")
+        logger.info("Will not overwrite data recorded during acquisition.")
         # Filter the acquisition keys from input data
-        outputdata = {key:value for key, value in ffedata.iteritems() if key not in acquisitionkeys}
+        outputdata = {key:value for key, value in ffedata.items() if key not in acquisitionkeys}
 
     # Else: Copy everything
     else:
-        logger.info(u"Copy everything from input file to output file.")
+        logger.info("Copy everything from input file to output file.")
         outputdata = ffedata
 
     # Update data in output-file
@@ -242,14 +251,16 @@ elif command == "copy":
 
 # add data from input lines to input file (LOGGING)
 elif command == "add":
-    logger.info(u"Read from standard input.")
+    logger.info("Read from standard input.")
 
     # Create empty dictionary
     newdata = {}
 
-    # Read from stdin (this could also be a file piped in with <<)
-    lines = sys.stdin.readlines()
-    for line in lines:
+    # A data line is "<key>=<data>" or "<key>==<data>"; gives the key, the second equal sign (if any), and the data
+    datalinepattern = re.compile(r"^([^=]*)=(=?)(.*)$")
+
+    # Read from stdin line by line (this could also be a file piped in with <<)
+    for line in sys.stdin:
         # Strip string of new line, tab, or space characters at end or in the beginning
         line = line.strip()
 
@@ -257,17 +268,17 @@ elif command == "add":
         if len(line) == 0:
             continue
 
+        # Split line into key and data
+        match = datalinepattern.match(line)
+
         # No equal sign? Ignore!
-        if line.find("=") == -1:
+        if match is None:
             continue
 
-        # Evaluate data?
-        evaluatedata = bool(line.find("==") != -1)
-
-        # Split line into two things
-        key, data = line.split("=", 1)[0], line.split("=", 1)[1]
+        # Evaluate data (double equal sign)?
+        key, evaluatedata, data = match.group(1), bool(match.group(2)), match.group(3)
 
-        # Evaluated? Then eat first byte of data (== "=", because of the double "==")
+        # Evaluated? Then eat further equal signs (no Python expression starts with one)
         if evaluatedata:
             data = data.lstrip("=")
 
@@ -282,7 +293,10 @@ elif command == "add":
 
 # del data from input file (LOGGING)
 elif command == "del":
-    logger.info(u"Read from standard input.")
+    logger.info("Read from standard input.")
+
+    # Keys to remove from the dictionary
+    deletekeys = set()
 
     # Read from stdin (this could also be a file piped in with <<)
     for line in sys.stdin:
@@ -295,17 +309,19 @@ elif command == "del":
 
         # Do not delete acquisition keys if not --force-del is provided
         if not forcedel and line in acquisitionkeys:
-            logger.warning(u"Will not delete acquisition key '%s' because --force-del is not provided.", line)
+            logger.warning("Will not delete acquisition key '%s' because --force-del is not provided.", line)
             continue
 
-        # Try to delete key from dictionary (if exists, otherwise, ignore)
-        if line in ffedata:
-            del ffedata[line]
+        # Mark key for deletion (if it does not exist, it is ignored)
+        deletekeys.add(line)
+
+    # Remove all marked keys in one pass
+    ffedata = {key:value for key, value in ffedata.items() if key not in deletekeys}
 
     # Update data in file
     ffe.replaceDictionaryOfPng(inputfile, ffedata)
 
-    logger.info(u"Items removed. Dictionary of '%s' was updated.", inputfile)
+    logger.info("Items removed. Dictionary of '%s' was updated.", inputfile)
 
 
 
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -24,17 +24,11 @@
 # uses minimal logging.
 #
 
-# Import modules
-import cv2                          # OpenCV
-import numpy as np                  # Numpy - You always need this.
-import ffe                          # frequently-used function script
+# Import modules (Numpy, ffe, and matplotlib are imported after parsing the command-line, so that showing the help
+# page does not have to wait for them; scipy is only imported for the spline style)
 import sys                          # Sys functions
 import logging                      # Logging functions
 import getopt                       # Get and parse command-line arguments
-import matplotlib.pyplot as plt     # For plotting intermediate graphs (debug)
-import matplotlib.collections
-import scipy
-import scipy.interpolate
 
 
 # Function: Prints help page
@@ -57,6 +51,22 @@ def printHelpPage():
           "to left/middle point.")
     print("")
 
+
+# Function: Converts a list of pixel coordinates (skin or trajectory) into real-world coordinates (mm) relative to the
+#           origin. Uses the global resolution and origin (as arrays); returns the x-values and y-values as numpy
+#           arrays.
+# --------------------------------------------------------------------------------------------------------------------
+def convertToRealWorld(points):
+    # Nothing to convert?
+    if len(points) == 0:
+        return np.zeros(0), np.zeros(0)
+
+    # Only x and y of every point (trajectories also have widths)
+    coordinates = np.array(points, dtype=np.float64)[:, :2] * resolutionarray - originarray
+
+    return coordinates[:, 0], coordinates[:, 1]
+
+
 # Step 0: Parse command-line arguments
 # --------------------------------------------------------------------------------------------------------------------
 # Input/Outputfile
@@ -125,6 +135,14 @@ if len(inputfile) == 0:
     printHelpPage()
     sys.exit(1)
 
+# Import the modules needed for rendering
+import numpy as np                  # Numpy - You always need this.
+import ffe                          # frequently-used function script
+import matplotlib.pyplot as plt     # For plotting intermediate graphs (debug)
+import matplotlib.collections
+from matplotlib.ticker import MultipleLocator  # Ticks only where needed
+from matplotlib.patches import Patch           # Legend handles
+
 
 # Step 1: Setup logging
 # --------------------------------------------------------------------------------------------------------------------
@@ -150,8 +168,8 @@ if not silentmode:
     logger.addHandler(ch)
 
 # Start the program
-logger.info(u"####### Render trajectories #######")
-logger.info(u"Render trajectories on '%s'", inputfile)
+logger.info("####### Render trajectories #######")
+logger.info("Render trajectories on '%s'", inputfile)
 
 # Debug mode?
 if debugmode:
@@ -160,49 +178,47 @@ if debugmode:
 
 # Step 2: Open file and read data
 # --------------------------------------------------------------------------------------------------------------------
-# Read source image
-inputimage = cv2.imread(inputfile, cv2.IMREAD_COLOR)
+# Read data (the image itself is not needed, only the size of the separation zone)
+ffedata = ffe.loadDictionaryFromPng(inputfile)
 
 # Error?
-if inputimage is None:
-    logger.error(u"Input file could not be read.")
+if ffedata is None:
+    logger.error("Input file could not be read.")
     sys.exit(3)
 
-# Shape of image
-imageheight, imagewidth, imagebits = inputimage.shape
-
-# Read data
-ffedata = ffe.loadDictionaryFromPng(inputfile)
-
 # Are there trajectories in file's data?
 if "Inner separation zone" not in ffedata:
-    logger.error(u"No inner separation zone in file.")
+    logger.error("No inner separation zone in file.")
     sys.exit(-1)
 
-# Extracts the separation zone from the image
-zoneimage, transmatrix = ffe.extractZoneFromImage(inputimage, ffedata["Inner separation zone"], 10)
-
-# Shape of zone image
-zoneheight, zonewidth, zonebits = zoneimage.shape
+# Size of the separation zone as extracted from the image (without extracting it)
+transmatrix, zonewidth, zoneheight = ffe.getZoneTransformation(ffedata["Inner separation zone"])
 
 # Are there trajectories in file's data?
 if "Trajectories" not in ffedata:
-    logger.error(u"No trajectories in file.")
+    logger.error("No trajectories in file.")
     sys.exit(-1)
 
 # Read trajectories
 trajectories = ffedata["Trajectories"]
 
-# Sort trajectories
-trajectories = ffe.sortTrajectoriesByWeightedCoordinates(trajectories)
+# Sort trajectories by their weighted y-coordinate (as ffe.sortTrajectoriesByWeightedCoordinates does); the weighted
+# y-coordinates (in pixels) are calculated only once and kept for drawing the weighted-y lines
+weightedtrajectories = sorted([(ffe.calculateWeightedYOfTrajectory(trajectory), trajectory)
+                               for trajectory in trajectories], key=lambda item: item[0])
+trajectories = [trajectory for _, trajectory in weightedtrajectories]
+pixelweightedys = [weightedy for weightedy, _ in weightedtrajectories]
 
 # This is the resolution for both axes in mm per pixel
 resolution = (0.15, 0.15)
 
+# Physical dimensions of the zone in mm (read only once; if not given, they follow from the resolution)
+zonedimensions = (zonewidth * resolution[0], zoneheight * resolution[1])
+
 # Given in input file?
 if "Physical zone dimensions" in ffedata:
-    resolution = (float(ffedata["Physical zone dimensions"][0]) / float(zonewidth),
-                  float(ffedata["Physical zone dimensions"][1]) / float(zoneheight))
+    zonedimensions = (float(ffedata["Physical zone dimensions"][0]), float(ffedata["Physical zone dimensions"][1]))
+    resolution = (zonedimensions[0] / float(zonewidth), zonedimensions[1] / float(zoneheight))
 
 
 # Step 3: Rendering the trajectories
@@ -211,22 +227,27 @@ if "Physical zone dimensions" in ffedata:
 origin = (0, 0)
 
 if "Inlets" in ffedata:
-    # Inlets
-    inlets = np.array([(item[0], item[1]) for item in ffedata["Inlets"]])
+    # Inlets (only x and y); filled directly from the data without an intermediate list of tuples
+    inlets = np.fromiter((value for item in ffedata["Inlets"] for value in item[:2]), dtype=np.float64,
+                         count=2*len(ffedata["Inlets"])).reshape(-1, 2)
 
     # Useinlet given and in the range of given inlets? Well, then only use this one start point
     if 0 <= useinlet < len(inlets):
-        logger.info(u"Use inlet %d for origin point.", useinlet)
+        logger.info("Use inlet %d for origin point.", useinlet)
         origin = (inlets[useinlet][0], inlets[useinlet][1])
 
     # or just select the point nearest to center of the left side
     else:
         # First sort the points by distance from the center of the left side (0, zoneheight/2)
-        inlets = ffe.sortCoordinatesByDistanceToPoint(inlets, (0, int(ffedata["Physical zone dimensions"][1]/2)))
+        inlets = ffe.sortCoordinatesByDistanceToPoint(inlets, (0, int(zonedimensions[1]/2)))
 
         # Calculate new origin from nearest point (first point in array)
         origin = (inlets[0][0], inlets[0][1])
 
+# Resolution and origin as arrays for converting whole skins and trajectories at once
+resolutionarray = np.array(resolution, dtype=np.float64)
+originarray = np.array(origin, dtype=np.float64)
+
 
 # These are the "Tableau 10" colors as RGB. Changed the order a little bit.
 # Source: http://tableaufriction.blogspot.ca/2012/11/finally-you-can-use-tableau-data-colors.html
@@ -242,14 +263,17 @@ for i in range(len(tableau10)):
 ax = plt.axes()
 
 # Set axes ticks
-ax.set_xticks(np.arange(-50, 50, 5))
-ax.set_xticks(np.arange(-50, 50, 1), minor=True)
-ax.set_yticks(np.arange(-50, 50, 5))
-ax.set_yticks(np.arange(-50, 50, 1), minor=True)
+ax.xaxis.set_major_locator(MultipleLocator(5))
+ax.xaxis.set_minor_locator(MultipleLocator(1))
+ax.yaxis.set_major_locator(MultipleLocator(5))
+ax.yaxis.set_minor_locator(MultipleLocator(1))
 
 # Set axes limits
-ax.set_xlim([0-origin[0], float(ffedata["Physical zone dimensions"][0])-origin[0]])
-ax.set_ylim([0-origin[1], float(ffedata["Physical zone dimensions"][1])-origin[1]])
+ax.set_xlim([0-origin[0], zonedimensions[0]-origin[0]])
+ax.set_ylim([0-origin[1], zonedimensions[1]-origin[1]])
+
+# Limits are fixed, so do not rescale the axes when adding the trajectories
+ax.set_autoscale_on(False)
 
 # Set ticks
 ax.get_yaxis().set_tick_params(which='both', direction='out')
@@ -272,104 +296,103 @@ plt.grid()
 plt.axhline(y=0, color='black', ls='dashed', linewidth=3, zorder=0)
 plt.axvline(x=0, color='black', ls='dashed', linewidth=3, zorder=1)
 
-# Handles for legend
-handles = []
+# Polygons (spline and linear style) and weighted-y lines of the trajectories (both drawn together after all
+# trajectories) and their colors
+polygons = []
+polygoncolors = []
+weightedys = []
+weightedcolors = []
+
+# Resolution for interpolation of splines (the same for every trajectory)
+newres = np.arange(0, 1.01, 0.01)
+
+# Name of the rendering style for the log messages
+stylename = outputstyle.capitalize()
 
 # Process each trajectory
 for index, trajectory in enumerate(trajectories):
     # Get the skin of the trajectory
     skin = ffe.getSkinOfTrajectory(trajectory)
 
-    # Add handle
-    handles.append(matplotlib.lines.Line2D([0, 1], [0, 1], color=tableau10[index % len(tableau10)],
-                                           linewidth=5, alpha=0.5))
+    # Color of this trajectory
+    color = tableau10[index % len(tableau10)]
+
+    # Log the rendering of this trajectory
+    logger.info("%s rendering of trajectory %d...", stylename, index+1)
 
     # How to draw the trajectories... skeleton?
     if outputstyle == 'skeleton':
-        logger.info(u"Skeleton rendering of trajectory %d...", index+1)
-
-        # x-values for width
-        xvalues = [float(t[0] * resolution[0]) - origin[0] for t in skin]
-        # y-values for width
-        yvalues = [float(t[1] * resolution[1]) - origin[1] for t in skin]
+        # x-values and y-values for width
+        xvalues, yvalues = convertToRealWorld(skin)
 
         # Number of xvalues should be number of yvalues and it should be a multiply of 2 for drawing the lines properly
         if len(xvalues) == len(yvalues) and (len(xvalues) % 2) == 0:
             # Number of values devided by two
             halflen = int(len(xvalues)/2)
 
-            for l in xrange(halflen):
-                plt.plot([xvalues[l], xvalues[halflen*2-l-1]], [yvalues[l], yvalues[halflen*2-l-1]],
-                         lw=1, color=tableau10[index % len(tableau10)])
+            # Line from every point on one side to the corresponding point on the other side (second half of skin is
+            # in inverse direction); all in one collection, drawn like single lines
+            segments = np.stack((np.column_stack((xvalues[:halflen], yvalues[:halflen])),
+                                 np.column_stack((xvalues[halflen:][::-1], yvalues[halflen:][::-1]))), axis=1)
+            ax.add_collection(matplotlib.collections.LineCollection(segments, linewidths=1, colors=color,
+                                                                    capstyle='projecting', zorder=2),
+                              autolim=False)
 
         # Plot all width points (small)
-        plt.scatter(xvalues, yvalues, s=1, color=tableau10[index % len(tableau10)], zorder=100 + index)
+        plt.scatter(xvalues, yvalues, s=1, color=color, zorder=100 + index)
 
-        # x-values for trajectory
-        xvalues = [float(t[0] * resolution[0]) - origin[0] for t in trajectory]
-        # y-values for trajectory
-        yvalues = [float(t[1] * resolution[1]) - origin[1] for t in trajectory]
+        # x-values and y-values for trajectory
+        xvalues, yvalues = convertToRealWorld(trajectory)
 
         # Plot trajectory points itself
-        plt.plot(xvalues, yvalues, color=tableau10[index % len(tableau10)], zorder=100 + index)
-        plt.scatter(xvalues, yvalues, color=tableau10[index % len(tableau10)], zorder=100 + index)
+        plt.plot(xvalues, yvalues, color=color, zorder=100 + index)
+        plt.scatter(xvalues, yvalues, color=color, zorder=100 + index)
 
     # or splines?
     elif outputstyle == 'spline':
-        logger.info(u"Spline rendering of trajectory %d...", index+1)
+        # Import scipy's interpolation only for this style (loaded once, cached afterwards)
+        import scipy.interpolate
 
         # Convert to real-world dimensions
-        data = np.array([(float(t[0] * resolution[0]) - origin[0],
-                          float(t[1] * resolution[1]) - origin[1]) for t in skin])
-
-        # Resolution for interpolation
-        newres = np.arange(0, 1.01, 0.01)
+        data = np.array(convertToRealWorld(skin))
 
         # Interpolate as spline (cubic, k=3)
-        spline, _ = scipy.interpolate.splprep(data.transpose(), s=0)
-
-        # Get spline points of spline
-        splinepoints = scipy.interpolate.splev(newres, spline)
+        spline, _ = scipy.interpolate.splprep(data, s=0)
 
-        # Convert to vertices
-        vertices = [zip(splinepoints[0], splinepoints[1])]
+        # Get spline points of spline; one B-spline for each coordinate (knots, coefficients, degree)
+        splinepoints = [scipy.interpolate.BSpline(spline[0], coefficients, spline[2])(newres)
+                        for coefficients in spline[1]]
 
-        # Patch collection
-        pc = matplotlib.collections.PolyCollection(vertices, color=tableau10[index % len(tableau10)],
-                                                   zorder=100 + index,
-                                                   alpha=0.5)
+        # Convert to vertices of a polygon
+        polygons.append(np.column_stack(splinepoints))
+        polygoncolors.append(color)
 
-        # Add the collection
-        ax.add_collection(pc)
-
-        # Draw the weighted-y lines
-        weightedy = ffe.calculateWeightedYOfTrajectory(trajectory) * resolution[1] - origin[1]
-        plt.axhline(y=weightedy, color=tableau10[index % len(tableau10)], ls='dashed', linewidth=3, zorder=50 + index)
+        # Weighted-y line
+        weightedys.append(pixelweightedys[index] * resolution[1] - origin[1])
+        weightedcolors.append(color)
 
     # otherwise just use linear drawing (skin)
     elif outputstyle == 'linear':
-        logger.info(u"Linear rendering of trajectory %d...", index+1)
-
-        # x-values
-        xvalues = [float(t[0] * resolution[0]) - origin[0] for t in skin]
-        # y-values
-        yvalues = [float(t[1] * resolution[1]) - origin[1] for t in skin]
-
-        # Convert the skin to vertices
-        vertices = [zip(xvalues, yvalues)]
-
-        # Patch collection
-        pc = matplotlib.collections.PolyCollection(vertices, color=tableau10[index % len(tableau10)], zorder=100+index,
-                                                   alpha=0.5)
+        # x-values and y-values
+        xvalues, yvalues = convertToRealWorld(skin)
 
-        # Add the collection
-        ax.add_collection(pc)
+        # Convert the skin to vertices of a polygon
+        polygons.append(np.column_stack((xvalues, yvalues)))
+        polygoncolors.append(color)
 
-        # Draw the weighted-y lines
-        weightedy = ffe.calculateWeightedYOfTrajectory(trajectory) * resolution[1] - origin[1]
-        plt.axhline(y=weightedy, color=tableau10[index % len(tableau10)], ls='dashed', linewidth=3, zorder=50+index)
+        # Weighted-y line
+        weightedys.append(pixelweightedys[index] * resolution[1] - origin[1])
+        weightedcolors.append(color)
 
+# Draw the polygons in one collection (in order of the trajectories, i.e. later ones on top)
+if len(polygons) > 0:
+    ax.add_collection(matplotlib.collections.PolyCollection(polygons, color=polygoncolors, zorder=100, alpha=0.5),
+                      autolim=False)
 
+# Draw the weighted-y lines over the whole width of the plot; all at once
+if len(weightedys) > 0:
+    ax.hlines(weightedys, ax.get_xlim()[0], ax.get_xlim()[1], colors=weightedcolors, linestyles='dashed', linewidth=3,
+              zorder=50)
 
 
 # Set title
@@ -377,19 +400,20 @@ ax.set_title("Trajectories of %s" % inputfile, fontsize=18)
 ax.set_xlabel('x [mm]', fontsize=16, fontweight='bold')
 ax.set_ylabel('y [mm]', fontsize=16, fontweight='bold')
 
-# Set legend for trajectories
-ax.legend(handles, ["Trajectory %d" % (i+1) for i in xrange(len(trajectories))], loc='lower left').set_zorder(200)
+# Set legend for trajectories (one patch per trajectory in the color of the trajectory)
+ax.legend([Patch(color=tableau10[i % len(tableau10)], alpha=0.5) for i in range(len(trajectories))],
+          ["Trajectory %d" % (i+1) for i in range(len(trajectories))], loc='lower left').set_zorder(200)
 
 # Show the plot
 if len(outputfile) > 0:
     plt.savefig(outputfile)
-    logger.info(u"Saved plot to file %s.", outputfile)
+    logger.info("Saved plot to file %s.", outputfile)
 else:
     plt.show()
-    logger.info(u"Plotted.")
+    logger.info("Plotted.")
 
 # Final logging
-logger.info(u"####### Render trajectories end #######")
+logger.info("####### Render trajectories end #######")
 
 
 
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -25,7 +25,6 @@
 #
 
 # Import modules
-import cv2                          # OpenCV
 import numpy as np                  # Numpy - You always need this.
 import ffe                          # frequently-used function script
 import sys                          # Sys functions
@@ -33,9 +32,10 @@ import logging                      # Logging functions
 import getopt                       # Get and parse command-line arguments
 import matplotlib.pyplot as plt     # For plotting intermediate graphs (debug)
 import matplotlib.collections
+from matplotlib.ticker import MultipleLocator  # Ticks only where needed
+from matplotlib.patches import Patch           # Legend handles
 import scipy
 import scipy.interpolate
-import itertools                    # For iteration/combination purposes
 from statsmodels.nonparametric.smoothers_lowess import lowess  # For smoothing
 
 
@@ -142,8 +142,8 @@ if not silentmode:
     logger.addHandler(ch)
 
 # Start the program
-logger.info(u"####### Extract and render resolutions #######")
-logger.info(u"Render resolutions on '%s'", inputfile)
+logger.info("####### Extract and render resolutions #######")
+logger.info("Render resolutions on '%s'", inputfile)
 
 # Debug mode?
 if debugmode:
@@ -152,34 +152,25 @@ if debugmode:
 
 # Step 2: Open file and read data
 # --------------------------------------------------------------------------------------------------------------------
-# Read source image
-inputimage = cv2.imread(inputfile, cv2.IMREAD_COLOR)
+# Read data (the image itself is not needed, only the size of the separation zone)
+ffedata = ffe.loadDictionaryFromPng(inputfile)
 
 # Error?
-if inputimage is None:
-    logger.error(u"Input file could not be read.")
+if ffedata is None:
+    logger.error("Input file could not be read.")
     sys.exit(3)
 
-# Shape of image
-imageheight, imagewidth, imagebits = inputimage.shape
-
-# Read data
-ffedata = ffe.loadDictionaryFromPng(inputfile)
-
 # Are there trajectories in file's data?
 if "Inner separation zone" not in ffedata:
-    logger.error(u"No inner separation zone in file.")
+    logger.error("No inner separation zone in file.")
     sys.exit(-1)
 
-# Extracts the separation zone from the image
-zoneimage, transmatrix = ffe.extractZoneFromImage(inputimage, ffedata["Inner separation zone"], 10)
-
-# Shape of zone image
-zoneheight, zonewidth, zonebits = zoneimage.shape
+# Size of the separation zone as extracted from the image (without extracting it)
+transmatrix, zonewidth, zoneheight = ffe.getZoneTransformation(ffedata["Inner separation zone"])
 
 # Are there trajectories in file's data?
 if "Trajectories" not in ffedata:
-    logger.error(u"No trajectories in file.")
+    logger.error("No trajectories in file.")
     sys.exit(-1)
 
 # Read trajectories
@@ -191,10 +182,13 @@ trajectories = ffe.sortTrajectoriesByWeightedCoordinates(trajectories)
 # This is the resolution for both axes in mm per pixel
 resolution = (0.15, 0.15)
 
+# Physical dimensions of the zone in mm (read only once; if not given, they follow from the resolution)
+zonedimensions = (zonewidth * resolution[0], zoneheight * resolution[1])
+
 # Given in input file?
 if "Physical zone dimensions" in ffedata:
-    resolution = (float(ffedata["Physical zone dimensions"][0]) / float(zonewidth),
-                  float(ffedata["Physical zone dimensions"][1]) / float(zoneheight))
+    zonedimensions = (float(ffedata["Physical zone dimensions"][0]), float(ffedata["Physical zone dimensions"][1]))
+    resolution = (zonedimensions[0] / float(zonewidth), zonedimensions[1] / float(zoneheight))
 
 # These are the "Tableau 10" colors as RGB. Changed the order a little bit.
 # Source: http://tableaufriction.blogspot.ca/2012/11/finally-you-can-use-tableau-data-colors.html
@@ -217,7 +211,7 @@ if "Inlets" in ffedata:
     inlets = np.array([(item[0], item[1]) for item in ffedata["Inlets"]])
 
     # First sort the points by distance from the center of the left side (0, zoneheight/2)
-    inlets = ffe.sortCoordinatesByDistanceToPoint(inlets, (0, int(ffedata["Physical zone dimensions"][1]/2)))
+    inlets = ffe.sortCoordinatesByDistanceToPoint(inlets, (0, int(zonedimensions[1]/2)))
 
     # Calculate new origin from nearest point (first point in array)
     origin = (inlets[0][0], inlets[0][1])
@@ -226,13 +220,13 @@ if "Inlets" in ffedata:
 ax = plt.axes()
 
 # Set axes ticks
-ax.set_xticks(np.arange(-50, 50, 5))
-ax.set_xticks(np.arange(-50, 50, 1), minor=True)
-ax.set_yticks(np.arange(-50, 50, 1))
-ax.set_yticks(np.arange(-50, 50, 0.1), minor=True)
+ax.xaxis.set_major_locator(MultipleLocator(5))
+ax.xaxis.set_minor_locator(MultipleLocator(1))
+ax.yaxis.set_major_locator(MultipleLocator(1))
+ax.yaxis.set_minor_locator(MultipleLocator(0.1))
 
 # Set axes limits
-ax.set_xlim([0-origin[0], float(ffedata["Physical zone dimensions"][0])-origin[0]])
+ax.set_xlim([0-origin[0], zonedimensions[0]-origin[0]])
 ax.set_ylim(-0.1, 10)
 
 # Set ticks
@@ -249,13 +243,11 @@ plt.grid()
 # Draw axis lines
 plt.axvline(x=0, color='black', ls='dashed', linewidth=3, zorder=1)
 
-# Handles for legend
-handles = []
-
 # Step 4: Prepare combinations
 # --------------------------------------------------------------------------------------------------------------------
-# Create all combinations of trajectories (gives a list with (index1, index2) tuples)
-combinations = list(itertools.combinations(xrange(len(trajectories)), 2))
+# Create all combinations of trajectories (indices of the first and second trajectory of every combination; same order
+# as itertools.combinations)
+first, second = np.triu_indices(len(trajectories), 1)
 
 # This is the range. The maximum precision is one pixel
 evalrange = np.arange(0, zonewidth, 1)
@@ -269,47 +261,62 @@ maxres = 1.0
 # Drawn combos
 drawcombos = []
 
-# For each each combination
-for combo in combinations:
-    # Calculate for each x in drawrange a resolution of both trajectories
-    R = [ffe.getResolutionOfTrajectories(trajectories[combo[0]], trajectories[combo[1]], x) for x in evalrange]
+# Y and W of every trajectory for each x in evalrange, one row per trajectory (the splines of each trajectory are
+# fitted only once and not for every combination it is part of)
+yandws = [ffe.getYandWofTrajectoryArray(trajectory, evalrange) for trajectory in trajectories]
+Ys = np.array([Y for Y, W in yandws]).reshape(-1, len(evalrange))
+Ws = np.array([W for Y, W in yandws]).reshape(-1, len(evalrange))
+
+# Calculate for each x in drawrange the resolutions of all combinations at once (one row per combination)
+resolutions = ffe.getResolutionOfYandW(Ys[first], Ws[first], Ys[second], Ws[second])
 
+# Lines of the resolutions and smoothed resolutions (both drawn together after all combinations) and their colors
+resolutionlines = []
+smoothedlines = []
+linecolors = []
+
+# For each each combination
+for combo, R in zip(zip(first, second), resolutions):
     # Change maxres if necessary
-    if max(R) > maxres:
-        maxres = max(R)
+    if R.max() > maxres:
+        maxres = R.max()
 
-    # Put resolution and x-range in one array and transpose it; use drawrange instead of evalrange
-    data = np.array([drawrange, R]).transpose()
+    # Only points with a resolution above zero
+    positive = R > 0
 
-    # Remove points with zero resolution
-    data = data[data[:, -1] > 0]
+    # Put resolution and x-range of these points in one array; use drawrange instead of evalrange
+    data = np.column_stack((drawrange[positive], R[positive]))
 
     # Datapoints left?
     if len(data) > 0:
-        # Transpose again
-        data = data.transpose()
+        # Color of this combination
+        color = tableau10[len(drawcombos) % len(tableau10)]
 
-        # Smoothing?
+        # Smoothing? x is already sorted; points closer than 1% of the x-range are linearly interpolated instead of
+        # fitted again (as recommended by statsmodels)
         if smoothing:
-            smoothed = lowess(data[1], data[0], frac=smoothfrac)
-            plt.plot(smoothed[:, 0], smoothed[:, 1], color=tableau10[len(drawcombos) % len(tableau10)], lw=5,
-                     zorder=50 + len(drawcombos), linestyle='--')
-
-        # Plot the resolution
-        plt.plot(data[0], data[1], lw=2, color=tableau10[len(drawcombos) % len(tableau10)],
-                 zorder=100 + len(drawcombos))
+            smoothedlines.append(lowess(data[:, 1], data[:, 0], frac=smoothfrac, is_sorted=True,
+                                        delta=0.01*(data[-1, 0]-data[0, 0])))
 
-        # Add handle for legend
-        handles.append(matplotlib.lines.Line2D([0, 1], [0, 1], color=tableau10[len(drawcombos) % len(tableau10)],
-                                               linewidth=5, alpha=0.5))
+        # Resolution line (the color is also used for the legend)
+        resolutionlines.append(data)
+        linecolors.append(color)
 
         # Add to combo
         drawcombos.append(combo)
 
+# Draw the smoothed resolutions (dashed) and the resolutions in one collection each (later combinations on top)
+if len(smoothedlines) > 0:
+    ax.add_collection(matplotlib.collections.LineCollection(smoothedlines, colors=linecolors, linewidths=5,
+                                                            linestyles='--', capstyle='butt', joinstyle='round',
+                                                            zorder=50), autolim=False)
+if len(resolutionlines) > 0:
+    ax.add_collection(matplotlib.collections.LineCollection(resolutionlines, colors=linecolors, linewidths=2,
+                                                            capstyle='projecting', joinstyle='round', zorder=100),
+                      autolim=False)
 
 # Reconfigure y-axis
-ax.set_yticks(np.arange(-50, 50, 1))
-ax.set_yticks(np.arange(-50, 50, maxres/10.0), minor=True)
+ax.yaxis.set_minor_locator(MultipleLocator(maxres/10.0))
 ax.set_ylim(-0.1, maxres)
 
 
@@ -320,19 +327,19 @@ ax.set_title("Resolutions of %s" % inputfile, fontsize=18)
 ax.set_xlabel('x [mm]', fontsize=16, fontweight='bold')
 ax.set_ylabel('Resolution', fontsize=16, fontweight='bold')
 
-# Set legend for trajectories
-ax.legend(handles, ["R for %d <-> %d" % (combo[0]+1, combo[1]+1) for combo in drawcombos],
-          loc='upper left').set_zorder(200)
+# Set legend for trajectories (one patch per drawn combination in the color of its line)
+ax.legend([Patch(color=color, alpha=0.5) for color in linecolors],
+          ["R for %d <-> %d" % (combo[0]+1, combo[1]+1) for combo in drawcombos], loc='upper left').set_zorder(200)
 
 # Show the plot
 if len(outputfile) > 0:
     plt.savefig(outputfile)
-    logger.info(u"Saved plot to file %s.", outputfile)
+    logger.info("Saved plot to file %s.", outputfile)
 else:
     plt.show()
-    logger.info(u"Plotted.")
+    logger.info("Plotted.")
 
 # Final logging
-logger.info(u"####### Render resolutions end #######")
+logger.info("####### Render resolutions end #######")
 
 
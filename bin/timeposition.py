@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 #    Copyright (C) 2017 by Sven Kochmann
@@ -25,132 +25,161 @@
 #
 
 # Import modules
-import cv2                          # OpenCV
 import numpy as np                  # Numpy - You always need this.
 import ffe                          # frequently-used function script
 import sys                          # Sys functions
 import logging                      # Logging functions
 import getopt                       # Get and parse command-line arguments
-import matplotlib.pyplot as plt     # For plotting intermediate graphs (debug)
-import matplotlib.collections
-import scipy.stats                  # For the linear regression
 import os                           # Some operating system functions
+import multiprocessing              # Evaluating several files at once
+import functools                    # For caching the sorted inlets
 
 
-# Input directories
-inputdirs = ['flowch' + str(i+1) for i in xrange(5)]
-
-# For every directory...
-for channelindex, channel in enumerate(inputdirs):
-    # Status
-    print("Analyzing %s ..." % channel)
-
-    # Output table for results from this channel
-    outputchannel = []
-
-    # For every FFE file in this directory
-    for file in os.listdir(channel):
-
-        # Only FFE.png files:
-        if not file.endswith('FFE.png'):
-            continue
+# Function: Sorts the `inlets` (tuple of coordinate tuples) by distance to `point`; returns them as tuple of tuples.
+#           The files of a channel usually share the same inlets, so the result is cached (per process).
+# --------------------------------------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=32)
+def sortInletsByDistanceToPoint(inlets, point):
+    return tuple(map(tuple, ffe.sortCoordinatesByDistanceToPoint(np.array(inlets), point)))
 
-        # Read source image
-        inputimage = cv2.imread(channel+'/'+file, cv2.IMREAD_COLOR)
 
-        # Error?
-        if inputimage is None:
-            print("Input file could not be read")
-            sys.exit(3)
+# Function: Evaluates one FFE file of a channel; `arguments` is a tuple (channelindex, channel, file). Returns the rows
+#           (time, x, y, width) of the trajectories connected to the inlet of the channel as array, None if the file is
+#           skipped, or False if the file could not be read.
+# --------------------------------------------------------------------------------------------------------------------
+def evaluateFile(arguments):
+    # Index and directory of the channel and the file to evaluate
+    channelindex, channel, file = arguments
 
-        # Shape of image
-        imageheight, imagewidth, imagebits = inputimage.shape
+    # Read data (the image itself is not needed, only the size of the separation zone)
+    ffedata = ffe.loadDictionaryFromPng(channel+'/'+file)
 
-        # Read data
-        ffedata = ffe.loadDictionaryFromPng(channel+'/'+file)
+    # Error?
+    if ffedata is None:
+        print("Input file could not be read")
+        return False
 
-        # Are there trajectories in file's data?
-        if "Inner separation zone" not in ffedata:
-            print("No inner separation zone in file %s" % (channel+'/'+file))
-            continue
+    # Are there trajectories in file's data?
+    if "Inner separation zone" not in ffedata:
+        print("No inner separation zone in file %s" % (channel+'/'+file))
+        return None
 
-        # No trajectory data? or No inlet data? Skip
-        if "Trajectories" not in ffedata or "Inlets" not in ffedata:
-            continue
+    # No trajectory data? or No inlet data? Skip
+    if "Trajectories" not in ffedata or "Inlets" not in ffedata:
+        return None
 
-        # No trajectories?
-        if len(ffedata["Trajectories"]) == 0:
-            continue
+    # No trajectories?
+    if len(ffedata["Trajectories"]) == 0:
+        return None
 
-        # Not enough inlets? (should be 5)
-        if len(ffedata["Inlets"]) != 5:
-            continue
+    # Not enough inlets? (should be 5)
+    if len(ffedata["Inlets"]) != 5:
+        return None
 
-        # Extracts the separation zone from the image
-        zoneimage, transmatrix = ffe.extractZoneFromImage(inputimage, ffedata["Inner separation zone"], 10)
+    # Size of the separation zone as extracted from the image (without extracting it)
+    transmatrix, zonewidth, zoneheight = ffe.getZoneTransformation(ffedata["Inner separation zone"])
 
-        # Shape of zone image
-        zoneheight, zonewidth, zonebits = zoneimage.shape
+    # This is the resolution for both axes in mm per pixel
+    resolution = (0.15, 0.15)
 
-        # This is the resolution for both axes in mm per pixel
-        resolution = (0.15, 0.15)
+    # Physical dimensions of the zone in mm (read only once; if not given, they follow from the resolution)
+    zonedimensions = (zonewidth * resolution[0], zoneheight * resolution[1])
 
-        # Given in input file?
-        if "Physical zone dimensions" in ffedata:
-            resolution = (float(ffedata["Physical zone dimensions"][0]) / float(zonewidth),
-                          float(ffedata["Physical zone dimensions"][1]) / float(zoneheight))
+    # Given in input file?
+    if "Physical zone dimensions" in ffedata:
+        zonedimensions = (float(ffedata["Physical zone dimensions"][0]),
+                          float(ffedata["Physical zone dimensions"][1]))
+        resolution = (zonedimensions[0] / float(zonewidth), zonedimensions[1] / float(zoneheight))
 
-        # Convert inlets to array
-        inlets = np.array([(item[0], item[1]) for item in ffedata["Inlets"]])
+    # Convert inlets to array
+    inlets = np.array([(item[0], item[1]) for item in ffedata["Inlets"]])
 
-        # Calculate the inlet we want to observe; measurements were done from inlet 1-5; Inlets have all the same x;
-        # round and convert to int
-        injectinlet = (int(round(inlets[0][0])), int(round(inlets[4][1]-channelindex*(inlets[4][1]-inlets[3][1]))))
+    # Calculate the inlet we want to observe; measurements were done from inlet 1-5; Inlets have all the same x;
+    # round (half away from zero, coordinates are positive; round() would round half to even) and convert to int
+    injectinlet = (int(np.floor(inlets[0][0] + 0.5)),
+                   int(np.floor(inlets[4][1]-channelindex*(inlets[4][1]-inlets[3][1]) + 0.5)))
 
-        #print("Inject ", injectinlet)
+    #print("Inject ", injectinlet)
 
-        # Let the origin be the first inlet if exists (origin is in real dimensions, i.e. mm!)
-        origin = (0, 0)
+    # Let the origin be the first inlet if exists (origin is in real dimensions, i.e. mm!)
+    origin = (0, 0)
 
-        # First sort the points by distance from the center of the left side (0, zoneheight/2)
-        inlets = ffe.sortCoordinatesByDistanceToPoint(inlets, (0, int(ffedata["Physical zone dimensions"][1] / 2)))
+    # First sort the points by distance from the center of the left side (0, zoneheight/2)
+    inlets = sortInletsByDistanceToPoint(tuple(map(tuple, inlets)), (0, int(zonedimensions[1] / 2)))
 
-        # Calculate new origin from nearest point (first point in array)
-        origin = (inlets[0][0], inlets[0][1])
+    # Calculate new origin from nearest point (first point in array)
+    origin = (inlets[0][0], inlets[0][1])
 
-        # Check each trajectory
-        for trajectory in ffedata["Trajectories"]:
-            # Get first point in real coordinates; round and convert to int
-            start = (int(round(trajectory[0][0]*resolution[0])),
-                     int(round(trajectory[0][1]*resolution[1])))
+    # First (only x and y) and last point of every trajectory as arrays, one row per trajectory
+    starts = np.array([trajectory[0][:2] for trajectory in ffedata["Trajectories"]], dtype=np.float64)
+    ends = np.array([trajectory[-1] for trajectory in ffedata["Trajectories"]], dtype=np.float64)
 
-            # Check if start is injectinlet, if not continue (we only want to consider the trajectories, which are
-            # connected to the corresponding inlets); We use the rounded inletwidth as boundary
-            if np.hypot(start[0]-injectinlet[0], start[1]-injectinlet[1]) > int(round(ffedata["Inlets"][0][2])):
-                continue
+    # Get first points in real coordinates; round (half away from zero like above, coordinates are positive)
+    starts = np.floor(starts * resolution + 0.5)
 
-            # Collect data for saving to file: relative time, coordinates of last point, width of last point
-            time = ffedata["Snapshot time"]
-            x, y, w = trajectory[-1][0]*resolution[0]-origin[0], \
-                      trajectory[-1][1]*resolution[1]-origin[1], \
-                      trajectory[-1][2]*resolution[1]  # Just use resolution of y and no origin for width
-
-            # Append results to list
-            outputchannel.append((time, x, y, w))
-
-            #print("%.2f: %.2f, %.2f, %2.f" % (time, x, y, w))
-
-    # Convert output to structured numpy array
-    outputchannel = np.array(outputchannel, dtype=[(channel + ' time', 'float64'), (channel + ' x', 'float64'),
-                                                   (channel + ' y', 'float64'), (channel + ' width', 'float64')])
-
-    # Save this numpy array
-    np.savetxt(channel+'.csv', outputchannel, delimiter='\t', header="\t".join(outputchannel.dtype.names))
+    # Check if start is injectinlet (we only want to consider the trajectories, which are connected to the
+    # corresponding inlets); We use the rounded inletwidth as boundary (compared squared; all values are integers)
+    inletradius = int(np.floor(ffedata["Inlets"][0][2] + 0.5))
+    connected = (starts[:, 0]-injectinlet[0])**2 + (starts[:, 1]-injectinlet[1])**2 <= inletradius*inletradius
 
+    # No connected trajectories? Skip
+    if not connected.any():
+        return None
 
+    # Collect data for saving to file in one preallocated block of rows: relative time, coordinates of last
+    # point, width of last point (just use resolution of y and no origin for width); written in place
+    block = np.empty((np.count_nonzero(connected), 4))
+    block[:, 0] = ffedata["Snapshot time"]
+    np.multiply(ends[connected], (resolution[0], resolution[1], resolution[1]), out=block[:, 1:])
+    np.subtract(block[:, 1:], (origin[0], origin[1], 0), out=block[:, 1:])
 
+    # Return results of this file
+    return block
 
 
+# Input directories
+inputdirs = ['flowch' + str(i+1) for i in range(5)]
 
+# Evaluate several files at once (every file is independent of the others) if possible; the worker processes are
+# always forked, whatever the default start method of the platform is, so that they do not run this script again
+# (where forking is not available, e.g. on Windows, the files are evaluated one after another)
+pool = None
+if multiprocessing.cpu_count() > 1 and "fork" in multiprocessing.get_all_start_methods():
+    pool = multiprocessing.get_context("fork").Pool()
 
+# For every directory...
+for channelindex, channel in enumerate(inputdirs):
+    # Status
+    print("Analyzing %s ..." % channel)
 
+    # Every FFE.png file in this directory
+    files = [(channelindex, channel, file) for file in os.listdir(channel) if file.endswith('FFE.png')]
+
+    # Evaluate the files (results are in the same order as the files)
+    if pool is not None:
+        results = pool.map(evaluateFile, files)
+    else:
+        results = [evaluateFile(arguments) for arguments in files]
+
+    # A file could not be read? Stop (but close the pool first)
+    if any(result is False for result in results):
+        if pool is not None:
+            pool.close()
+            pool.join()
+        sys.exit(3)
+
+    # Output table for results from this channel (one block of rows per file)
+    outputchannel = [result for result in results if result is not None]
+
+    # Join all blocks (or no rows at all) to one plain array of rows (time, x, y, width)
+    outputchannel = np.vstack(outputchannel) if len(outputchannel) > 0 else np.zeros((0, 4))
+
+    # Save this numpy array; a plain float array is formatted row by row with one format string (no structured
+    # records); 17 significant digits are enough to read back exactly the same values
+    np.savetxt(channel+'.csv', outputchannel, fmt='%.17g', delimiter='\t',
+               header="\t".join([channel + ' time', channel + ' x', channel + ' y', channel + ' width']))
+
+# No more files to evaluate
+if pool is not None:
+    pool.close()
+    pool.join()